@@ -0,0 +1,597 @@
+import asyncio
+import json
+import logging
+import os
+from signal import SIGINT, SIGTERM
+from aiogram import Bot, Dispatcher, types, F
+from aiogram.filters import Command, CommandObject
+from aiogram.types import (
+    InlineKeyboardButton,
+    ReplyKeyboardMarkup,
+    KeyboardButton,
+    ReplyKeyboardRemove,
+)
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import StatesGroup, State
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from hub import SubscriptionHub
+from sharding import ShardedHub, SHARD_WORKERS
+from dispatcher import SignalDispatcher
+from storage import StoreWriter, migrate_json, open_store
+from symbols import SymbolCache, SymbolResolver
+from engine import StudyParams, DEFAULT_PARAMS, check_params
+from tradingview import STUDY_INPUT_TYPES
+from models import User, TIMEFRAMES, TIMEFRAME_INDEX, make_pair, make_params
+from aiohttp import web
+from logs import setup_logging
+import metrics
+
+API_TOKEN = os.getenv("API_TOKEN")
+DATA_FILE = "users.json"
+USER_STORE = os.getenv("USER_STORE") or "sqlite"
+DB_FILE = os.getenv("DB_FILE") or "users.db"
+MESSAGES_FILE = "messages.json"
+WATCHLIST_LIMIT = int(os.getenv("WATCHLIST_LIMIT") or 50)
+OWNER_ID = [5964376811, 394824718, 1255352761]
+# Публічна адреса бота; якщо задана - оновлення приходять вебхуком
+# на WEBHOOK_PATH цього ж aiohttp-сервера замість long polling
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH") or "/webhook"
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+# Інший Bot API сервер (локальний telegram-bot-api або фейковий для тестів)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+
+if TELEGRAM_API_URL:
+    bot = Bot(token=API_TOKEN, session=AiohttpSession(
+        api=TelegramAPIServer.from_base(TELEGRAM_API_URL)))
+else:
+    bot = Bot(token=API_TOKEN)
+dp = Dispatcher()
+users = {}
+messages = {}
+signal_templates = {}
+user_store = open_store(USER_STORE,
+                        DATA_FILE if USER_STORE == "json" else DB_FILE)
+user_writer = StoreWriter(user_store)
+symbol_resolver = SymbolResolver(SymbolCache())
+logger = logging.getLogger(__name__)
+
+
+async def handle_main_page(request):
+    return web.Response(text="RESPONSE 200",
+                        content_type="text/html")
+
+
+async def handle_metrics(request):
+    return web.Response(text=metrics.render(),
+                        content_type="text/plain")
+
+
+async def handle_health(request):
+    # 503, якщо є завислі потоки або відключені сокети;
+    # ?streams=all - стан кожного потоку, інакше лише проблемних
+    report = hub.health(streams=request.query.get("streams") == "all")
+    return web.json_response(report, status=200 if report["ok"] else 503)
+
+
+async def create_server():
+    app = web.Application()
+
+    app.router.add_get("/", handle_main_page)
+    app.router.add_get("/metrics", handle_metrics)
+    app.router.add_get("/health", handle_health)
+    if WEBHOOK_URL:
+        SimpleRequestHandler(dispatcher=dp, bot=bot,
+                             secret_token=WEBHOOK_SECRET).register(
+                                 app, path=WEBHOOK_PATH)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host="0.0.0.0", port=os.getenv("PORT") or 10000)
+    await site.start()
+
+    return runner
+
+
+def load_users_from_file():
+    global users
+    migrate_json(user_store, DATA_FILE)
+    users = {chat_id: User.from_record(data)
+             for chat_id, data in user_store.load().items()}
+
+
+def load_messages_from_file():
+    global messages
+    if os.path.exists(MESSAGES_FILE):
+        with open(MESSAGES_FILE, "r", encoding='utf-8') as file:
+            messages = json.load(file)
+
+
+def save_user(chat_id):
+    user_writer.schedule(chat_id, users[chat_id].to_record())
+
+
+def parse_params(text):
+    # 8 значень in_0..in_7 через пробіл, кожне - типу, з яким його
+    # оголошує create_study: float, integer або bool (0/1)
+    values = text.split()
+    if len(values) != len(StudyParams._fields):
+        raise ValueError(text)
+    parsed = []
+    for kind, value in zip(STUDY_INPUT_TYPES, values):
+        if kind == "bool":
+            if value.lower() not in ("0", "1", "false", "true"):
+                raise ValueError(value)
+            parsed.append(value.lower() in ("1", "true"))
+        elif kind == "float":
+            number = float(value)
+            parsed.append(int(number) if number.is_integer() else number)
+        else:
+            parsed.append(int(value))
+    return check_params(parsed)
+
+
+def format_params(params):
+    return " ".join(str(int(value)) if isinstance(value, bool)
+                    else str(value) for value in params)
+
+
+async def mark_inactive(chat_id):
+    if chat_id not in users or not users[chat_id].active:
+        return
+    users[chat_id].active = False
+    save_user(chat_id)
+    await hub.set_active(chat_id, False)
+
+
+def signal_template(symbol, timeframe, signal):
+    # Текст сигналу потоку без ціни закриття форматується один раз:
+    # (до ціни, після ціни)
+    key = (symbol, timeframe, signal)
+    template = signal_templates.get(key)
+    if template is None:
+        template = signal_templates[key] = tuple(messages["SIGNAL"].format(
+            "🔴" if signal == "Short" else "🟢", signal, "\0", symbol,
+            timeframe_names[timeframe]).split("\0"))
+    return template
+
+
+async def send_signal(user, symbol, timeframe, signal, close,
+                      params=DEFAULT_PARAMS):
+    head, tail = signal_template(symbol, timeframe, signal)
+    signal_dispatcher.submit(user, (symbol, timeframe, params),
+                             f"{head}{close}{tail}")
+
+
+def format_digest(texts):
+    if len(texts) == 1:
+        return texts[0]
+    return "\n".join([messages["DIGEST"].format(len(texts))] + texts)
+
+
+signal_dispatcher = SignalDispatcher(bot, on_forbidden=mark_inactive,
+                                     format_digest=format_digest)
+if SHARD_WORKERS:
+    hub = ShardedHub(send_signal)
+else:
+    hub = SubscriptionHub(send_signal)
+order_executor = None
+
+
+timeframes = TIMEFRAMES
+timeframe_names = {tf["code"]: tf["display"] for tf in timeframes}
+
+
+@dp.message.outer_middleware()
+@dp.callback_query.outer_middleware()
+async def wake_chat(handler, event, data):
+    # будь-яке повідомлення від чату, що блокував бота, будить його потоки
+    chat = data.get("event_chat")
+    if chat is not None and chat.id in users and \
+            not users[chat.id].active:
+        users[chat.id].active = True
+        save_user(chat.id)
+        await hub.set_active(chat.id, users[chat.id].listening)
+    return await handler(event, data)
+
+
+class UserState(StatesGroup):
+    waiting_for_currency = State()
+    waiting_for_timeframe = State()
+
+
+def find_timeframe(text):
+    return next((tf for tf in timeframes
+                 if text in (tf["display"], tf["code"])), None)
+
+
+async def add_pair(message: types.Message, symbol, timeframe):
+    chat_id = message.chat.id
+    user = users.setdefault(chat_id, User())
+    watchlist = user.watchlist
+    pair = make_pair(symbol, timeframe["code"])
+    if pair in watchlist:
+        await message.answer(messages["PAIR_EXISTS"])
+        return False
+    if len(watchlist) >= WATCHLIST_LIMIT:
+        await message.answer(messages["WATCHLIST_LIMIT"].format(
+            WATCHLIST_LIMIT))
+        return False
+    watchlist.append(pair)
+    save_user(chat_id)
+    # пара, яку вже дивляться інші чати, лише додає підписника до потоку
+    await hub.subscribe(chat_id, symbol, timeframe["code"],
+                        user.study_params)
+    return True
+
+
+async def remove_pair(chat_id, symbol, code):
+    user = users[chat_id]
+    pair = (symbol, TIMEFRAME_INDEX.get(code))
+    if pair not in user.watchlist:
+        return False
+    user.watchlist.remove(pair)
+    save_user(chat_id)
+    await hub.unsubscribe(chat_id, symbol, code, user.study_params)
+    return True
+
+
+@dp.message(Command("start"))
+async def send_welcome(message: types.Message, state: FSMContext):
+    user_id = message.from_user.id
+    if user_id not in OWNER_ID:
+        await message.reply("У вас нет доступа к этому боту")
+        return
+    chat_id = message.chat.id
+    if chat_id not in users:
+        users[chat_id] = User()
+        save_user(chat_id)
+        await message.answer(messages["START_MESSAGE"])
+        await state.clear()
+        await state.set_state(UserState.waiting_for_currency)
+    else:
+        await show_user_settings(message)
+
+
+async def validate_symbol(message: types.Message, text):
+    # Канонічне ім'я символу з TradingView; None - символу немає, тоді
+    # користувач отримує схожі символи з локального індексу
+    symbol = text.strip().upper()
+    try:
+        canonical = await symbol_resolver.canonical(symbol)
+    except Exception as e:
+        logger.warning("Symbol %s not validated: %s", symbol, e)
+        return symbol
+    if canonical is None:
+        builder = InlineKeyboardBuilder()
+        for suggestion in symbol_resolver.suggest(symbol):
+            builder.row(InlineKeyboardButton(
+                text=suggestion, callback_data=f"pick:{suggestion}"))
+        await message.answer(messages["SYMBOL_NOT_FOUND"].format(symbol),
+                             reply_markup=builder.as_markup())
+    return canonical
+
+
+async def watchlist_symbol(user, text):
+    # Символ зі списку користувача для /remove: як введено, канонічне ім'я
+    # з кешу або TradingView (BTCUSDT -> BINANCE:BTCUSDT), інакше - єдиний
+    # символ списку з таким тикером
+    symbol = text.strip().upper()
+    symbols = {pair[0] for pair in user.watchlist}
+    if symbol in symbols:
+        return symbol
+    try:
+        canonical = await symbol_resolver.canonical(symbol)
+    except Exception as e:
+        logger.warning("Symbol %s not resolved: %s", symbol, e)
+        canonical = None
+    if canonical in symbols:
+        return canonical
+    matches = {name for name in symbols if name.split(":")[-1] == symbol}
+    return matches.pop() if len(matches) == 1 else symbol
+
+
+async def ask_timeframe(message: types.Message, state: FSMContext, symbol):
+    await state.update_data(symbol=symbol)
+    await message.answer(
+        messages["SELECT_TIMEFRAME"],
+        reply_markup=get_timeframe_keyboard(),
+    )
+    await state.set_state(UserState.waiting_for_timeframe)
+
+
+@dp.message(UserState.waiting_for_currency)
+async def set_currency(message: types.Message, state: FSMContext):
+    symbol = await validate_symbol(message, message.text or "")
+    if symbol is not None:
+        await ask_timeframe(message, state, symbol)
+
+
+@dp.callback_query(F.data.startswith("pick:"))
+async def pick_symbol(callback: types.CallbackQuery, state: FSMContext):
+    await ask_timeframe(callback.message, state,
+                        callback.data.removeprefix("pick:"))
+    await callback.answer()
+
+
+@dp.message(UserState.waiting_for_timeframe)
+async def set_timeframe(message: types.Message, state: FSMContext):
+    chosen_timeframe = find_timeframe(message.text)
+
+    if chosen_timeframe:
+        data = await state.get_data()
+        await state.clear()
+        if await add_pair(message, data["symbol"], chosen_timeframe):
+            await message.answer(
+                messages["SELECTED_TIMEFRAME"].format(
+                    chosen_timeframe["display"]),
+                reply_markup=ReplyKeyboardRemove(),
+            )
+        await show_user_settings(message)
+    else:
+        await message.answer(
+            messages["TIMEFRAME_ERROR_1"],
+            reply_markup=get_timeframe_keyboard(),
+        )
+
+
+async def show_user_settings(message: types.Message):
+    chat_id = message.chat.id
+    watchlist = users[chat_id].pairs()
+
+    builder = InlineKeyboardBuilder()
+    for symbol, code in watchlist:
+        builder.row(
+            InlineKeyboardButton(
+                text=messages["REMOVE_PAIR"].format(
+                    symbol, timeframe_names[code]),
+                callback_data=f"remove:{symbol}|{code}")
+        )
+    builder.row(
+        InlineKeyboardButton(text=messages["ADD_PAIR"],
+                             callback_data="add_pair")
+    )
+
+    if watchlist:
+        text = messages["SETTINGS"].format("\n".join(
+            f"{symbol} - {timeframe_names[code]}"
+            for symbol, code in watchlist))
+    else:
+        text = messages["WATCHLIST_EMPTY"]
+    params = users[chat_id].study_params
+    if params != DEFAULT_PARAMS:
+        text += "\n" + messages["PARAMS"].format(format_params(params))
+    await message.answer(text, reply_markup=builder.as_markup())
+
+
+@dp.callback_query(F.data == "add_pair")
+async def add_pair_button(callback: types.CallbackQuery, state: FSMContext):
+    await callback.message.answer(messages["ADD_PAIR_PR"])
+    await state.clear()
+    await state.set_state(UserState.waiting_for_currency)
+    await callback.answer()
+
+
+@dp.callback_query(F.data.startswith("remove:"))
+async def remove_pair_button(callback: types.CallbackQuery):
+    chat_id = callback.message.chat.id
+    symbol, code = callback.data.removeprefix("remove:").rsplit("|", 1)
+    if chat_id in users:
+        await remove_pair(chat_id, symbol, code)
+        await callback.message.delete()
+        await show_user_settings(callback.message)
+    await callback.answer()
+
+
+def get_timeframe_keyboard():
+    kb = []
+    row = []
+    for index, tf in enumerate(timeframes):
+        button = KeyboardButton(text=tf["display"])
+        row.append(button)
+        if (index + 1) % 3 == 0:
+            kb.append(row)
+            row = []
+    if row:
+        kb.append(row)
+
+    return ReplyKeyboardMarkup(keyboard=kb, resize_keyboard=True,
+                               one_time_keyboard=True)
+
+
+@dp.message(Command("settings", "list"))
+async def settings_command(message: types.Message):
+    if message.from_user.id not in OWNER_ID:
+        await message.reply("У вас нет доступа к этому боту")
+        return
+    if message.chat.id not in users:
+        users[message.chat.id] = User()
+        save_user(message.chat.id)
+    await show_user_settings(message)
+
+
+@dp.message(Command("add", "remove"))
+async def pair_command(message: types.Message, command: CommandObject):
+    # /add BINANCE:BTCUSDT 15, /remove BINANCE:BTCUSDT 15
+    if message.from_user.id not in OWNER_ID:
+        await message.reply("У вас нет доступа к этому боту")
+        return
+    args = (command.args or "").split(maxsplit=1)
+    timeframe = find_timeframe(args[1]) if len(args) == 2 else None
+    if timeframe is None:
+        await message.answer(messages["PAIR_USAGE"])
+        return
+    chat_id = message.chat.id
+    if chat_id not in users:
+        users[chat_id] = User()
+    if command.command == "add":
+        symbol = await validate_symbol(message, args[0])
+        if symbol is None:
+            return
+        await add_pair(message, symbol, timeframe)
+    else:
+        symbol = await watchlist_symbol(users[chat_id], args[0])
+        if not await remove_pair(chat_id, symbol, timeframe["code"]):
+            await message.answer(messages["PAIR_NOT_FOUND"].format(
+                symbol, timeframe["display"]))
+    await show_user_settings(message)
+
+
+@dp.message(Command("search"))
+async def search_command(message: types.Message, command: CommandObject):
+    if message.from_user.id not in OWNER_ID:
+        await message.reply("У вас нет доступа к этому боту")
+        return
+    found = symbol_resolver.search((command.args or "").strip())
+    if not command.args or not found:
+        await message.answer(messages["SEARCH_EMPTY"])
+        return
+    builder = InlineKeyboardBuilder()
+    for symbol in found:
+        builder.row(InlineKeyboardButton(text=symbol,
+                                         callback_data=f"pick:{symbol}"))
+    await message.answer(messages["SEARCH_RESULTS"],
+                         reply_markup=builder.as_markup())
+
+
+@dp.message(Command("mute"))
+async def mute_command(message: types.Message):
+    if message.from_user.id not in OWNER_ID:
+        await message.reply("У вас нет доступа к этому боту")
+        return
+    chat_id = message.chat.id
+    if chat_id not in users:
+        return
+    users[chat_id].muted = True
+    save_user(chat_id)
+    await hub.set_active(chat_id, False)
+    await message.answer(messages["MUTED"])
+
+
+@dp.message(Command("unmute"))
+async def unmute_command(message: types.Message):
+    if message.from_user.id not in OWNER_ID:
+        await message.reply("У вас нет доступа к этому боту")
+        return
+    chat_id = message.chat.id
+    if chat_id not in users:
+        return
+    users[chat_id].muted = False
+    save_user(chat_id)
+    await hub.set_active(chat_id, users[chat_id].listening)
+    await message.answer(messages["UNMUTED"])
+
+
+@dp.message(Command("params"))
+async def params_command(message: types.Message, command: CommandObject):
+    # /params - поточні, /params 8 8 25 0 2 5 20 10 - свої, /params reset
+    if message.from_user.id not in OWNER_ID:
+        await message.reply("У вас нет доступа к этому боту")
+        return
+    chat_id = message.chat.id
+    if chat_id not in users:
+        users[chat_id] = User()
+    user = users[chat_id]
+    args = (command.args or "").strip()
+    if not args:
+        await message.answer(messages["PARAMS"].format(
+            format_params(user.study_params)) + "\n" +
+            messages["PARAMS_USAGE"])
+        return
+    if args.lower() == "reset":
+        params = DEFAULT_PARAMS
+    else:
+        try:
+            params = parse_params(args)
+        except ValueError:
+            await message.answer(messages["PARAMS_USAGE"])
+            return
+    old_params = user.study_params
+    user.params = make_params(params)
+    save_user(chat_id)
+    # потоки з новими параметрами ділять серію з уже відкритими
+    if params != old_params:
+        for symbol, code in user.pairs():
+            await hub.subscribe(chat_id, symbol, code, params)
+            await hub.unsubscribe(chat_id, symbol, code, old_params)
+    await message.answer(messages["PARAMS"].format(format_params(params)))
+
+
+async def subscribe_users():
+    # Сокети відкриваються поступово (TV_CONNECT_RATE,
+    # TV_CONNECT_CONCURRENCY), потоки неактивних користувачів
+    # створюються одразу сплячими
+    for chat_id, user in list(users.items()):
+        if not user.listening:
+            await hub.set_active(chat_id, False)
+        params = user.study_params
+        for symbol, code in user.pairs():
+            await hub.subscribe(chat_id, symbol, code, params)
+
+
+async def run_webhook():
+    # Лише одна репліка на токен: стан діалогів (FSM) живе в пам'яті,
+    # а кожен процес сам тримає потоки і розсилає сигнали всім своїм
+    # користувачам, тож кілька реплік за балансувальником дублювали б
+    # сигнали і губили діалоги. Старі оновлення скидаються, як і перед
+    # long polling
+    await bot.set_webhook(WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+                          secret_token=WEBHOOK_SECRET,
+                          drop_pending_updates=True,
+                          allowed_updates=dp.resolve_used_update_types())
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    # SIGTERM/SIGINT завершують роботу через finally у main, як
+    # handle_signals у start_polling
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (SIGTERM, SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        for signum in (SIGTERM, SIGINT):
+            loop.remove_signal_handler(signum)
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        await bot.session.close()
+
+
+async def run_polling():
+    # вебхук, лишений попереднім запуском із WEBHOOK_URL, блокує
+    # getUpdates (409 Conflict); разом із ним скидаються старі оновлення
+    await bot.delete_webhook(drop_pending_updates=True)
+    await dp.start_polling(bot)
+
+
+async def main():
+    global order_executor
+    setup_logging()
+    load_users_from_file()
+    load_messages_from_file()
+    symbol_resolver.cache.load()
+    runner = await create_server()
+    signal_dispatcher.start()
+    hub.start()
+    if os.getenv("BINANCE_API_KEY"):
+        from binanceapi import OrderExecutor
+        order_executor = OrderExecutor()
+        await order_executor.start()
+        for symbol, timeframe in order_executor.pairs:
+            await hub.add_listener(order_executor.on_signal, symbol,
+                                   timeframe)
+    await subscribe_users()
+    try:
+        if WEBHOOK_URL:
+            await run_webhook()
+        else:
+            await run_polling()
+    finally:
+        await runner.cleanup()
+        if order_executor is not None:
+            await order_executor.close()
+        await hub.close()
+        await signal_dispatcher.close()
+        await user_writer.close()
+        await symbol_resolver.cache.close()
@@ -0,0 +1,165 @@
+# Реплей записаних кадрів (TV_RECORD_DIR) через той самий шлях
+# розбору і сигналів, що й у живому режимі, без мережі
+#
+#   python backtest.py recordings/*.tvrec --horizon 5
+import argparse
+import asyncio
+import json
+import time
+
+import protocol
+from recording import read_frames, OUTGOING
+from engine import DEFAULT_PARAMS
+from tradingview import (TradingViewConnection, TradingViewMultiConnection,
+                         Study, study_params, MESSAGE_TYPES, MESSAGE_MARKER,
+                         SIGNAL_ENGINE)
+
+
+class Backtest:
+    def __init__(self, horizon: int = 5, history: bool = True):
+        self._horizon = horizon
+        self._history = history
+        self._multi = TradingViewMultiConnection(record_dir=None)
+        self._symbols = {}
+        self._closes = {}
+        self.signals = []
+        self.frames = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+
+    async def _handle_outgoing(self, frame):
+        for _, start, end in protocol.iter_frames(frame):
+            if frame.startswith("~h~", start):
+                continue
+            msg = json.loads(frame[start:end])
+            method, params = msg.get("m"), msg.get("p")
+            if method == "resolve_symbol":
+                self._symbols[params[0]] = json.loads(params[2][1:])["symbol"]
+            elif method == "create_series":
+                key = params[0]
+                if key not in self._multi._sessions:
+                    # локальний рушій рахує стратегію за замовчуванням,
+                    # study-режим - ті study, що є в записі
+                    connection = TradingViewConnection(
+                        self._symbols.get(key), params[4], session_key=key,
+                        params=DEFAULT_PARAMS if SIGNAL_ENGINE == "local"
+                        else None)
+                    connection.emit_history = self._history
+                    await self._multi.add_session(connection)
+                self._multi._sessions[key]._start_session()
+            elif method == "create_study":
+                connection = self._multi._sessions.get(params[0])
+                study = Study(study_params(params[5]), params[1])
+                if connection is not None and all(
+                        s.params != study.params for s in connection.studies):
+                    connection.add_study(study)
+            elif method == "remove_study":
+                connection = self._multi._sessions.get(params[0])
+                for study in connection.studies if connection else ():
+                    if study.id == params[1]:
+                        connection.remove_study(study)
+            elif method == "chart_delete_session":
+                await self._multi.remove_session(
+                    self._multi._sessions.get(params[0]))
+
+    def _collect_closes(self, frame):
+        for kind, msg in protocol.decode(frame, MESSAGE_TYPES,
+                                         MESSAGE_MARKER):
+            if kind != protocol.MESSAGE:
+                continue
+            data = msg["p"][1]
+            closes = self._closes.setdefault(msg["p"][0], {})
+            for key, study in data.items():
+                if key.startswith("st") and isinstance(study, dict):
+                    for item in study.get("st", ()):
+                        closes[item["v"][0]] = item["v"][-1]
+            if "sds_1" in data:
+                for item in data["sds_1"].get("s", ()):
+                    closes[item["v"][0]] = item["v"][4]
+
+    async def run(self, paths):
+        incoming = []
+        for path in paths:
+            for _, direction, frame in read_frames(path):
+                if direction == OUTGOING:
+                    await self._flush(incoming)
+                    incoming = []
+                    await self._handle_outgoing(frame)
+                else:
+                    incoming.append(frame)
+        await self._flush(incoming)
+
+    async def _flush(self, frames):
+        start = time.perf_counter()
+        for frame in frames:
+            for study, signal, close in self._multi._process(frame):
+                if study is not None and study.connection is not None:
+                    self.signals.append((study.connection.session_key,
+                                         study.params, signal, close,
+                                         study.signal_bar_time))
+        self.elapsed += time.perf_counter() - start
+        self.frames += len(frames)
+        for frame in frames:
+            self.bytes += len(frame)
+            self._collect_closes(frame)
+
+    def report(self):
+        counts = {}
+        hits = 0
+        scored = 0
+        bar_index = {key: sorted(closes)
+                     for key, closes in self._closes.items()}
+        for key, params, signal, close, bar_time in self.signals:
+            name = f"{self._symbols.get(key)} {signal}"
+            if params != DEFAULT_PARAMS:
+                name += f" {tuple(params)}"
+            counts[name] = counts.get(name, 0) + 1
+            bars = bar_index.get(key, [])
+            if bar_time not in self._closes.get(key, {}):
+                continue
+            future = bars.index(bar_time) + self._horizon
+            if future >= len(bars):
+                continue
+            future_close = self._closes[key][bars[future]]
+            scored += 1
+            if (future_close > close) == (signal == "Long"):
+                hits += 1
+
+        return {
+            "frames": self.frames,
+            "bytes": self.bytes,
+            "seconds": round(self.elapsed, 6),
+            "frames_per_second": round(self.frames / self.elapsed)
+            if self.elapsed else None,
+            "us_per_frame": round(self.elapsed * 1e6 / self.frames, 3)
+            if self.frames else None,
+            "signals": len(self.signals),
+            "signal_counts": counts,
+            "horizon": self._horizon,
+            "scored_signals": scored,
+            "hit_rate": round(hits / scored, 4) if scored else None,
+        }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--horizon", type=int, default=5,
+                        help="bars after the signal used to score a hit")
+    parser.add_argument("--live-only", action="store_true",
+                        help="skip signals in the history batches")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    backtest = Backtest(args.horizon, history=not args.live_only)
+    await backtest.run(args.paths)
+    result = backtest.report()
+    if args.json:
+        print(json.dumps(result))
+        return
+    for key, value in result.items():
+        print(f"{key:<20} {value}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,140 @@
+# Вартість встановлення з'єднань для N сесій: побудова кадрів handshake
+# і повний handshake N сесій на фейковому сервері TradingView
+#
+#   python benchmarks/bench_handshake.py --sessions 1000
+#
+# "baseline" - кожна сесія заново серіалізує всі кадри через json.dumps,
+# як до шаблонів; "templates" - поточний TradingViewConnection
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import tradingview  # noqa: E402
+from tradingview import (TradingViewConnection,  # noqa: E402
+                         TradingViewMultiConnection)
+
+
+def baseline_messages(self):
+    key = self.session_key
+    build = self._build_message
+    return [
+        build({"m": "chart_create_session", "p": [key, ""]}),
+        build({"m": "resolve_symbol",
+               "p": [key, "sds_sym_1",
+                     f'={{"adjustment":"splits",'
+                     f'"symbol":"{self.symbol}"}}']}),
+        build({"m": "create_series",
+               "p": [key, "sds_1", "s1", "sds_sym_1", self.timeframe, 300,
+                     ""]}),
+        build(self._study_payload(key)),
+    ]
+
+
+def make_sessions(count):
+    return [TradingViewConnection(f"BINANCE:SYM{i}USDT", "15")
+            for i in range(count)]
+
+
+def bench_build(count, rounds):
+    # перший раунд - нові сесії, решта - повтор після перепідключення
+    results = {}
+    for name, method in (("baseline", baseline_messages),
+                         ("templates",
+                          TradingViewConnection._session_messages)):
+        sessions = make_sessions(count)
+        timings = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            size = 0
+            for session in sessions:
+                for frame in method(session):
+                    size += len(frame)
+            timings.append(time.perf_counter() - start)
+        results[name] = (timings[0], min(timings[1:] or timings), size)
+    return results
+
+
+async def bench_connect(count, per_socket, port, rounds):
+    tradingview.WS_URL = f"ws://127.0.0.1:{port}"
+    tradingview.WS_HEADERS = {}
+    sockets = []
+    sessions = make_sessions(count)
+    for i in range(0, count, per_socket):
+        multi = TradingViewMultiConnection(record_dir=None)
+        for session in sessions[i:i + per_socket]:
+            await multi.add_session(session)
+        sockets.append(multi)
+
+    timings = []
+    for _ in range(rounds):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        handshakes = [multi._connect_once() for multi in sockets]
+        await asyncio.gather(*(anext(h) for h in handshakes))
+        timings.append((time.perf_counter() - wall,
+                        time.process_time() - cpu))
+        for multi, h in zip(sockets, handshakes):
+            # відповіді сервера ніхто не читає, тож чергу websockets
+            # переповнено і чесного close не дочекатися
+            multi._websocket.close_timeout = 0.1
+            await h.aclose()
+    return timings
+
+
+async def run_connect(args):
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(__file__),
+                                      "fake_tradingview.py"),
+         "--port", str(args.port), "--interval", "3600",
+         "--heartbeat", "3600"])
+    try:
+        await asyncio.sleep(1)
+        results = {}
+        original = TradingViewConnection._session_messages
+        for name, method in (("baseline", baseline_messages),
+                             ("templates", original)):
+            TradingViewConnection._session_messages = method
+            results[name] = await bench_connect(
+                args.sessions, args.per_socket, args.port, args.rounds)
+        TradingViewConnection._session_messages = original
+        return results
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--per-socket", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--no-connect", action="store_true")
+    args = parser.parse_args()
+
+    print(f"Frame build, {args.sessions} sessions:")
+    for name, (first, repeat, size) in bench_build(
+            args.sessions, args.rounds).items():
+        print(f"  {name:10} first {first * 1000:8.2f} ms "
+              f"({first / args.sessions * 1e6:6.1f} us/session), "
+              f"reconnect {repeat * 1000:8.2f} ms, "
+              f"{size / 1024:.0f} KiB")
+
+    if args.no_connect:
+        return
+    print(f"Handshake, {args.sessions} sessions on "
+          f"{-(-args.sessions // args.per_socket)} sockets "
+          f"(client wall / cpu):")
+    for name, timings in asyncio.run(run_connect(args)).items():
+        print(f"  {name:10} " + ", ".join(
+            f"{wall * 1000:.0f}/{cpu * 1000:.0f} ms"
+            for wall, cpu in timings))
+
+
+if __name__ == "__main__":
+    main()
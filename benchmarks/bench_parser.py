@@ -0,0 +1,127 @@
+# Порівняння старого regex-парсера кадрів з protocol.decode
+#
+#   python benchmarks/bench_parser.py [frames.txt | recording.tvrec]
+#
+# frames.txt - по одному сирому websocket-повідомленню на рядок,
+# recording.tvrec - запис із TV_RECORD_DIR (лише вхідні кадри);
+# без аргументу використовуються згенеровані кадри у форматі TradingView
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import protocol  # noqa: E402
+from recording import read_frames, INCOMING  # noqa: E402
+
+SESSION = "cs_0123456789ab"
+
+
+def legacy_parse(message):
+    segments = re.split(r'~m~\d+~m~', message)
+    json_messages = []
+
+    for segment in segments:
+        if segment:
+            json_data = json.loads(segment)
+            json_messages.append(json_data)
+
+    return json_messages
+
+
+def legacy_loop(frames):
+    found = 0
+    for data in frames:
+        if "~~h" in data:
+            continue
+        for msg in legacy_parse(data):
+            if msg.get("m") == "du" and "st7" in msg["p"][1]:
+                found += 1
+    return found
+
+
+def decoder_loop(frames, loads, sessions=None):
+    protocol.loads = loads
+    found = 0
+    for data in frames:
+        for kind, msg in protocol.decode(data, marker='"st7":',
+                                         sessions=sessions):
+            if kind == protocol.MESSAGE:
+                found += 1
+    return found
+
+
+def _frame(payload):
+    text = json.dumps(payload, separators=(",", ":"))
+    return f"~m~{len(text)}~m~{text}"
+
+
+def generate_frames(count=20000, seed=1):
+    rnd = random.Random(seed)
+    frames = []
+    t = 1735000000
+    price = 95000.0
+    for i in range(count):
+        price += rnd.uniform(-50, 50)
+        roll = rnd.random()
+        if roll < 0.1:
+            frames.append(f"~m~4~m~~h~{i % 10}")
+        elif roll < 0.5:
+            frames.append(_frame({"m": "qsd", "p": ["qs_x", {
+                "n": "BINANCE:BTCUSDT", "s": "ok",
+                "v": {"lp": price, "volume": rnd.uniform(1, 1e4),
+                      "ch": rnd.uniform(-100, 100)}}]}))
+        else:
+            bar = [t + i * 60, price, price + 10, price - 10, price,
+                   rnd.uniform(1, 100)]
+            study = [t + i * 60] + [rnd.uniform(0, 1) for _ in range(12)] + [
+                200 if roll > 0.95 else 0, 300 if roll < 0.52 else 0, price]
+            frames.append(
+                _frame({"m": "du", "p": [SESSION, {
+                    "sds_1": {"s": [{"i": 299, "v": bar}],
+                              "ns": {"d": "", "indexes": "nochange"},
+                              "t": "s1", "lbs": {"bar_close_time": t}}}]})
+                + _frame({"m": "du", "p": [SESSION, {
+                    "st7": {"st": [{"i": 299, "v": study}],
+                            "ns": {"d": "", "indexes": "nochange"},
+                            "t": "st1"}}]}))
+    return frames
+
+
+def bench(name, func, frames, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        found = func(frames)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<20} {len(frames) / best:>12,.0f} frames/s "
+          f"{best * 1e6 / len(frames):>8.2f} us/frame  found={found}")
+
+
+def main():
+    sessions = None
+    if len(sys.argv) > 1 and sys.argv[1].endswith(".tvrec"):
+        frames = [frame for _, direction, frame in read_frames(sys.argv[1])
+                  if direction == INCOMING]
+    elif len(sys.argv) > 1:
+        with open(sys.argv[1], encoding="utf-8") as file:
+            frames = [line.rstrip("\n") for line in file if line.strip()]
+    else:
+        frames = generate_frames()
+        sessions = {SESSION: None}
+
+    bench("regex + json", legacy_loop, frames)
+    bench("decode + json",
+          lambda f: decoder_loop(f, json.loads, sessions), frames)
+    if protocol.orjson is not None:
+        bench("decode + orjson",
+              lambda f: decoder_loop(f, protocol.orjson.loads, sessions),
+              frames)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Пам'ять на користувача: записи сховища як dict-и (як бот тримав їх
+# раніше) проти моделі models.User
+#
+#   python benchmarks/bench_users.py --counts 1000,10000,100000
+#
+# Записи розбираються з json, як при завантаженні зі сховища, і
+# міряється, скільки пам'яті лишається зайнятою (tracemalloc)
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from models import TIMEFRAMES, User  # noqa: E402
+
+
+def make_records(count, symbols, pairs, seed=1):
+    rng = random.Random(seed)
+    names = [f"BINANCE:SYM{i}USDT" for i in range(symbols)]
+    codes = [tf["code"] for tf in TIMEFRAMES[:6]]
+    records = {}
+    for chat_id in range(1, count + 1):
+        watchlist = []
+        while len(watchlist) < pairs:
+            pair = [rng.choice(names), rng.choice(codes)]
+            if pair not in watchlist:
+                watchlist.append(pair)
+        record = {"watchlist": watchlist}
+        if chat_id % 10 == 0:
+            record["muted"] = True
+        records[chat_id] = json.dumps(record)
+    return records
+
+
+def load_dicts(records):
+    return {chat_id: json.loads(data) for chat_id, data in records.items()}
+
+
+def load_users(records):
+    return {chat_id: User.from_record(json.loads(data))
+            for chat_id, data in records.items()}
+
+
+def measure(load, records):
+    gc.collect()
+    tracemalloc.start()
+    users = load(records)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del users
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--counts", default="1000,10000,100000")
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--pairs", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'users':>8} {'dict B/user':>12} {'User B/user':>12} "
+          f"{'ratio':>6}")
+    for count in map(int, args.counts.split(",")):
+        records = make_records(count, args.symbols, args.pairs)
+        dicts = measure(load_dicts, records)
+        users = measure(load_users, records)
+        print(f"{count:>8} {dicts / count:>12.0f} {users / count:>12.0f} "
+              f"{dicts / users:>6.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# Локальна фейкова біржа Binance USDⓈ-M для OrderExecutor: REST
+# (exchangeInfo, listenKey, order) і user-data websocket на одному порту
+#
+#   python benchmarks/fake_binance.py --port 8090 --fill-delay 0.2
+#   BINANCE_USER_STREAM_URL=ws://127.0.0.1:8090/ws ...
+#
+# Клієнт ccxt перенаправляється сюди через point_exchange. Ринковий ордер
+# приймається зі статусом NEW, а FILLED приходить подією
+# ORDER_TRADE_UPDATE через fill_delay секунд (None - ніколи, статус
+# лише у GET order); early=True шле подію ще до відповіді на POST order
+import argparse
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+from aiohttp import web, WSMsgType
+
+MARKETS = ("EOSUSDT", "BTCUSDT")
+
+
+def _market(symbol):
+    base = symbol.removesuffix("USDT")
+    return {
+        "symbol": symbol, "pair": symbol, "contractType": "PERPETUAL",
+        "deliveryDate": 4133404800000, "onboardDate": 1569398400000,
+        "status": "TRADING", "baseAsset": base, "quoteAsset": "USDT",
+        "marginAsset": "USDT", "pricePrecision": 3,
+        "quantityPrecision": 1, "baseAssetPrecision": 8,
+        "quotePrecision": 8, "underlyingType": "COIN",
+        "triggerProtect": "0.0500", "orderTypes": ["LIMIT", "MARKET"],
+        "timeInForce": ["GTC"],
+        "filters": [
+            {"filterType": "PRICE_FILTER", "minPrice": "0.001",
+             "maxPrice": "100000", "tickSize": "0.001"},
+            {"filterType": "LOT_SIZE", "minQty": "0.1",
+             "maxQty": "1000000", "stepSize": "0.1"},
+            {"filterType": "MARKET_LOT_SIZE", "minQty": "0.1",
+             "maxQty": "1000000", "stepSize": "0.1"},
+        ],
+    }
+
+
+def point_exchange(exchange, base_url):
+    # усі REST-адреси клієнта ccxt - на фейкову біржу, шляхи ті самі
+    for key, url in exchange.urls["api"].items():
+        if isinstance(url, str) and url.startswith("http"):
+            exchange.urls["api"][key] = base_url + urlsplit(url).path
+
+
+class FakeBinance:
+    def __init__(self, fill_delay=0.05, early=False):
+        self.fill_delay = fill_delay
+        self.early = early
+        self.orders = {}
+        self.calls = {}
+        self._next_id = 1000
+        self._streams = set()
+        self.stream_connected = asyncio.Event()
+
+    def _count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    async def exchange_info(self, request):
+        self._count("exchangeInfo")
+        futures = request.path.startswith("/fapi/")
+        return web.json_response({
+            "timezone": "UTC", "serverTime": int(time.time() * 1000),
+            "rateLimits": [], "exchangeFilters": [], "assets": [],
+            "symbols": [_market(s) for s in MARKETS] if futures else []})
+
+    async def listen_key(self, request):
+        self._count(f"listenKey {request.method}")
+        return web.json_response({"listenKey": "fake-listen-key"})
+
+    def _order(self, order_id):
+        order = self.orders[order_id]
+        return {
+            "orderId": order_id, "symbol": order["symbol"],
+            "status": order["status"], "clientOrderId": f"fake{order_id}",
+            "price": "0", "avgPrice": "1.000", "origQty": order["qty"],
+            "executedQty": order["qty"] if order["status"] == "FILLED"
+            else "0", "cumQuote": "0", "timeInForce": "GTC",
+            "type": "MARKET", "reduceOnly": False, "side": order["side"],
+            "updateTime": int(time.time() * 1000)}
+
+    async def create_order(self, request):
+        self._count("order POST")
+        params = dict(request.query)
+        params.update(await request.post())
+        order_id = self._next_id
+        self._next_id += 1
+        self.orders[order_id] = {"symbol": params["symbol"],
+                                 "side": params["side"],
+                                 "qty": params["quantity"],
+                                 "status": "NEW"}
+        if self.early:
+            # подія user stream обганяє відповідь REST
+            await self.fill(order_id)
+            await asyncio.sleep(0.05)
+        elif self.fill_delay is not None:
+            asyncio.get_running_loop().call_later(
+                self.fill_delay, lambda: asyncio.ensure_future(
+                    self.fill(order_id)))
+        response = self._order(order_id)
+        response["status"] = "NEW"
+        return web.json_response(response)
+
+    async def get_order(self, request):
+        self._count("order GET")
+        order_id = int(request.query["orderId"])
+        if order_id not in self.orders:
+            return web.json_response({"code": -2013,
+                                      "msg": "Order does not exist."},
+                                     status=400)
+        # без події статус з'ясовується запитом - ринковий ордер виконано
+        self.orders[order_id]["status"] = "FILLED"
+        return web.json_response(self._order(order_id))
+
+    async def fill(self, order_id):
+        order = self.orders[order_id]
+        order["status"] = "FILLED"
+        event = {"e": "ORDER_TRADE_UPDATE", "E": int(time.time() * 1000),
+                 "o": {"s": order["symbol"], "i": order_id, "X": "FILLED",
+                       "S": order["side"], "o": "MARKET"}}
+        for websocket in list(self._streams):
+            await websocket.send_json(event)
+
+    async def user_stream(self, request):
+        websocket = web.WebSocketResponse()
+        await websocket.prepare(request)
+        self._streams.add(websocket)
+        self.stream_connected.set()
+        try:
+            async for message in websocket:
+                if message.type == WSMsgType.ERROR:
+                    break
+        finally:
+            self._streams.discard(websocket)
+            if not self._streams:
+                self.stream_connected.clear()
+        return websocket
+
+    async def drop_streams(self):
+        for websocket in list(self._streams):
+            await websocket.close()
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/{api}/{version}/exchangeInfo",
+                           self.exchange_info)
+        app.router.add_route("*", "/fapi/v1/listenKey", self.listen_key)
+        app.router.add_post("/fapi/v1/order", self.create_order)
+        app.router.add_get("/fapi/v1/order", self.get_order)
+        app.router.add_get("/ws/{listen_key}", self.user_stream)
+        return app
+
+    async def serve(self, host="127.0.0.1", port=8090):
+        runner = web.AppRunner(self.app())
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        return runner, site._server.sockets[0].getsockname()[1]
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--fill-delay", type=float, default=0.05)
+    parser.add_argument("--early", action="store_true")
+    args = parser.parse_args()
+
+    server = FakeBinance(args.fill_delay, args.early)
+    await server.serve(args.host, args.port)
+    await asyncio.Future()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
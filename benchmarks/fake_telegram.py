@@ -0,0 +1,131 @@
+# Локальний фейковий Bot API для перевірки вебхук-режиму бота
+#
+#   python benchmarks/fake_telegram.py --port 8081 --push /start --chat 1
+#   TELEGRAM_API_URL=http://127.0.0.1:8081 WEBHOOK_URL=http://127.0.0.1:10000 \
+#       python bot.py
+#
+# Відповідає на методи Bot API, запам'ятовує вебхук із setWebhook і
+# після його встановлення штовхає туди текстові повідомлення з --push;
+# надіслані ботом повідомлення лежать у sent
+import argparse
+import asyncio
+import time
+
+import aiohttp
+from aiohttp import web
+
+
+class FakeTelegram:
+    def __init__(self, user_id=5964376811):
+        self.user_id = user_id
+        self.webhook_url = None
+        self.secret_token = None
+        self.webhook_set = asyncio.Event()
+        self.sent = []
+        self.calls = {}
+        self._update_id = 0
+        self._message_id = 0
+        self._session = None
+
+    def _message(self, chat_id, text, from_bot=True):
+        self._message_id += 1
+        message = {"message_id": self._message_id, "date": int(time.time()),
+                   "chat": {"id": chat_id, "type": "private"}, "text": text}
+        if not from_bot:
+            message["from"] = {"id": self.user_id, "is_bot": False,
+                               "first_name": "Test"}
+            if text.startswith("/"):
+                message["entities"] = [{"type": "bot_command", "offset": 0,
+                                        "length": len(text.split()[0])}]
+        return message
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Fake",
+                      "username": "fake_bot"}
+        elif method == "setWebhook":
+            self.webhook_url = params["url"]
+            self.secret_token = params.get("secret_token")
+            self.webhook_set.set()
+            result = True
+        elif method == "deleteWebhook":
+            self.webhook_url = None
+            self.webhook_set.clear()
+            result = True
+        elif method == "getUpdates":
+            if self.webhook_url:
+                # як справжній Bot API: polling заборонено, поки є вебхук
+                return web.json_response(
+                    {"ok": False, "error_code": 409,
+                     "description": "Conflict: can't use getUpdates method "
+                                    "while webhook is active; use "
+                                    "deleteWebhook to delete the webhook "
+                                    "first"}, status=409)
+            await asyncio.sleep(float(params.get("timeout") or 0))
+            result = []
+        elif method == "sendMessage":
+            self.sent.append((time.monotonic(), int(params["chat_id"]),
+                              params["text"]))
+            result = self._message(int(params["chat_id"]), params["text"])
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def push(self, chat_id, text):
+        # Доставляє оновлення так само, як Telegram: POST на вебхук
+        # із заголовком секрету
+        await self.webhook_set.wait()
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        self._update_id += 1
+        update = {"update_id": self._update_id,
+                  "message": self._message(chat_id, text, from_bot=False)}
+        headers = {}
+        if self.secret_token:
+            headers["X-Telegram-Bot-Api-Secret-Token"] = self.secret_token
+        async with self._session.post(self.webhook_url, json=update,
+                                      headers=headers) as response:
+            return response.status
+
+    async def serve(self, host="127.0.0.1", port=8081):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--chat", type=int, default=1)
+    parser.add_argument("--push", action="append", default=[])
+    args = parser.parse_args()
+
+    server = FakeTelegram()
+    await server.serve(args.host, args.port)
+    for text in args.push:
+        status = await server.push(args.chat, text)
+        print(f"push {text!r} -> {status}")
+    while True:
+        await asyncio.sleep(1)
+        for _, chat_id, text in server.sent:
+            print(f"sent to {chat_id}: {text}")
+        server.sent.clear()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,186 @@
+# Локальний websocket-сервер, що розмовляє протоколом ~m~ TradingView
+#
+#   python benchmarks/fake_tradingview.py --port 8765 --drop-after 50
+#
+# На кожну chart-сесію періодично шле du зі значеннями всіх її study
+# (сигнали study зсунуті на in_0 - 8 барів, щоб параметри відрізнялись).
+# Кадр шлеться раз на interval, бар триває ticks_per_bar кадрів; номер
+# бару абсолютний (від unix-часу), як у справжнього TradingView, тож бар,
+# що формувався до обриву, приходить і після перепідключення.
+# Періодично шле серцебиття ~h~ і, якщо задано --drop-after, обриває
+# з'єднання після вказаної кількості кадрів. resolve_symbol отримує
+# symbol_resolved, а символи з "INVALID" у назві - symbol_error.
+# З --stamp-close ціна закриття - unix-час відправки кадру (mod 1e5),
+# щоб отримувач міг порахувати затримку до себе. Для перевірки
+# виявлення зависань: --freeze-after - сокет замовкає (без даних і
+# серцебиття) через стільки секунд після підключення, а сесії символів
+# із silent не отримують du
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import websockets
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import protocol  # noqa: E402
+
+
+def frame(payload):
+    text = payload if isinstance(payload, str) else \
+        json.dumps(payload, separators=(",", ":"))
+    return f"~m~{len(text)}~m~{text}"
+
+
+class FakeTradingView:
+    def __init__(self, interval=1.0, heartbeat=10.0, drop_after=None,
+                 signal_every=5, stamp_close=False, freeze_after=None,
+                 ticks_per_bar=1):
+        self.interval = interval
+        self.heartbeat = heartbeat
+        self.drop_after = drop_after
+        self.signal_every = signal_every
+        self.stamp_close = stamp_close
+        self.freeze_after = freeze_after
+        self.ticks_per_bar = ticks_per_bar
+        self.silent = set()
+        self.signals = 0
+        self.created = []
+        self.connections = 0
+        self.drops = 0
+        self.open_sockets = 0
+
+    def study_update(self, session, studies, bar):
+        if self.stamp_close:
+            close = round(time.time() % 1e5, 3)
+        else:
+            close = 100.0 + bar % 7
+        data = {}
+        for study_id, shift in studies.items():
+            step = (bar + shift) % self.signal_every
+            long_v = 200 if step == 0 else 0
+            short_v = 300 if step == self.signal_every // 2 else 0
+            if long_v or short_v:
+                self.signals += 1
+            data[study_id] = {"st": [{"i": bar, "v": [
+                bar, long_v, short_v, close]}], "t": "st1"}
+        return frame({"m": "du", "p": [session, data]})
+
+    @staticmethod
+    def resolve(session, series, spec):
+        symbol = json.loads(spec[1:])["symbol"]
+        if "INVALID" in symbol:
+            return frame({"m": "symbol_error",
+                          "p": [session, series, "invalid symbol"]})
+        exchange, _, name = symbol.rpartition(":")
+        exchange = exchange or "BINANCE"
+        return frame({"m": "symbol_resolved", "p": [session, series, {
+            "name": name, "exchange": exchange, "description": name,
+            "type": "spot", "pro_name": f"{exchange}:{name}",
+            "full_name": f"{exchange}:{name}"}]})
+
+    async def handler(self, websocket):
+        self.connections += 1
+        self.open_sockets += 1
+        sessions = {}
+        symbols = {}
+        sent = 0
+        opened = time.monotonic()
+
+        async def pump():
+            nonlocal sent
+            next_heartbeat = time.monotonic() + self.heartbeat
+            while True:
+                await asyncio.sleep(self.interval)
+                bar = int(time.time() / (self.interval * self.ticks_per_bar))
+                if self.freeze_after is not None and \
+                        time.monotonic() - opened > self.freeze_after:
+                    continue
+                for session, studies in list(sessions.items()):
+                    if not studies or symbols.get(session) in self.silent:
+                        continue
+                    await websocket.send(
+                        self.study_update(session, studies, bar))
+                    sent += 1
+                if time.monotonic() >= next_heartbeat:
+                    next_heartbeat += self.heartbeat
+                    await websocket.send(frame(f"~h~{bar}"))
+                if self.drop_after is not None and sent >= self.drop_after:
+                    self.drops += 1
+                    await websocket.close()
+                    return
+
+        await websocket.send(frame({"session_id": "fake", "timestamp": 0}))
+        task = asyncio.create_task(pump())
+        try:
+            async for data in websocket:
+                for _, start, end in protocol.iter_frames(data):
+                    if data.startswith("~h~", start):
+                        continue
+                    message = json.loads(data[start:end])
+                    method, params = message["m"], message["p"]
+                    if method == "chart_create_session":
+                        sessions[params[0]] = {}
+                        self.created.append(params[0])
+                    elif method == "chart_delete_session":
+                        sessions.pop(params[0], None)
+                        symbols.pop(params[0], None)
+                    elif method == "create_study":
+                        sessions.setdefault(params[0], {})[params[1]] = \
+                            int(params[5]["in_0"]["v"]) - 8
+                    elif method == "remove_study":
+                        sessions.get(params[0], {}).pop(params[1], None)
+                    elif method == "resolve_symbol":
+                        symbols[params[0]] = \
+                            json.loads(params[2][1:])["symbol"]
+                        await websocket.send(self.resolve(*params))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            task.cancel()
+            self.open_sockets -= 1
+
+    @staticmethod
+    def _dedupe_headers(path, headers):
+        # бот шле Connection/Upgrade і в extra_headers, а websockets
+        # відхиляє такі дублікати
+        for name in ("Connection", "Upgrade", "Host"):
+            values = headers.get_all(name)
+            if len(values) > 1:
+                del headers[name]
+                headers[name] = values[-1]
+        return None
+
+    async def serve(self, host="127.0.0.1", port=8765):
+        return await websockets.serve(self.handler, host, port,
+                                      process_request=self._dedupe_headers)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--heartbeat", type=float, default=10.0)
+    parser.add_argument("--drop-after", type=int)
+    parser.add_argument("--signal-every", type=int, default=5)
+    parser.add_argument("--stamp-close", action="store_true")
+    parser.add_argument("--freeze-after", type=float)
+    parser.add_argument("--ticks-per-bar", type=int, default=1)
+    parser.add_argument("--silent", action="append", default=[],
+                        help="symbol whose sessions get no data")
+    args = parser.parse_args()
+
+    server = FakeTradingView(args.interval, args.heartbeat, args.drop_after,
+                             args.signal_every, args.stamp_close,
+                             args.freeze_after, args.ticks_per_bar)
+    server.silent.update(args.silent)
+    await server.serve(args.host, args.port)
+    await asyncio.Future()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
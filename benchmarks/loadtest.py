@@ -0,0 +1,278 @@
+# Навантажувальний тест бота: фейкові TradingView і Bot API у цьому
+# процесі, bot.py - окремим процесом із N синтетичними користувачами
+#
+#   python benchmarks/loadtest.py --users 2000 --symbols 200 --duration 60
+#   python benchmarks/loadtest.py --users 5000 --json loadtest.jsonl
+#
+# Фейковий TradingView шле у close час відправки кадру (--stamp-close),
+# тож затримка сигнал -> sendMessage береться прямо з тексту
+# повідомлення. CPU і RSS - процесу бота разом із воркерами шардингу
+# (/proc, лише Linux; RSS процесів сумується). Користувачі генеруються
+# з фіксованим --seed, а --json дописує рядок із комітом і конфігурацією,
+# щоб прогони на різних комітах можна було порівнювати
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fake_telegram import FakeTelegram  # noqa: E402
+from fake_tradingview import FakeTradingView  # noqa: E402
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def make_users(count, symbols, pairs, timeframes, seed):
+    rng = random.Random(seed)
+    names = [f"BINANCE:SYM{i}USDT" for i in range(symbols)]
+    pairs = min(pairs, symbols * len(timeframes))
+    users = {}
+    for chat_id in range(1, count + 1):
+        watchlist = []
+        while len(watchlist) < pairs:
+            pair = [rng.choice(names), rng.choice(timeframes)]
+            if pair not in watchlist:
+                watchlist.append(pair)
+        users[str(chat_id)] = {"watchlist": watchlist}
+    return users
+
+
+def read_stat(pid):
+    # (ppid, cpu секунд, rss байт) з /proc/<pid>/stat
+    with open(f"/proc/{pid}/stat") as file:
+        data = file.read()
+    fields = data[data.rindex(")") + 2:].split()
+    return (int(fields[1]),
+            (int(fields[11]) + int(fields[12])) / CLOCK_TICKS,
+            int(fields[21]) * PAGE_SIZE)
+
+
+def process_usage(pid):
+    # сумарні cpu і rss процесу та всіх його нащадків
+    stats = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                stats[int(entry)] = read_stat(int(entry))
+            except (OSError, ValueError, IndexError):
+                continue
+    tree, pending = set(), [pid]
+    while pending:
+        current = pending.pop()
+        tree.add(current)
+        pending.extend(child for child, (ppid, _, _) in stats.items()
+                       if ppid == current and child not in tree)
+    cpu = sum(stats[p][1] for p in tree if p in stats)
+    rss = sum(stats[p][2] for p in tree if p in stats)
+    return cpu, rss
+
+
+def signal_stamps(text):
+    # рядки сигналів: "🟢 Long <close> <symbol> <timeframe>", у дайджесті
+    # їх кілька після заголовка
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) >= 3 and parts[1] in ("Long", "Short"):
+            try:
+                yield float(parts[2])
+            except ValueError:
+                pass
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def scrape_metrics(port):
+    # сума значень кожної метрики бота по всіх мітках
+    totals = {}
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(
+                    f"http://127.0.0.1:{port}/metrics") as response:
+                text = await response.text()
+    except aiohttp.ClientError:
+        return totals
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        name, _, value = line.rpartition(" ")
+        name = name.split("{")[0]
+        try:
+            totals[name] = totals.get(name, 0) + float(value)
+        except ValueError:
+            pass
+    return totals
+
+
+def git_revision():
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return revision + ("-dirty" if dirty else "")
+
+
+async def run(args):
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    users = make_users(args.users, args.symbols, args.pairs,
+                       args.timeframes.split(","), args.seed)
+    with open(os.path.join(workdir, "users.json"), "w") as file:
+        json.dump(users, file)
+    shutil.copy(os.path.join(ROOT, "messages.json"), workdir)
+
+    tradingview = FakeTradingView(interval=args.interval,
+                                  heartbeat=args.heartbeat,
+                                  signal_every=args.signal_every,
+                                  stamp_close=True)
+    tv_server = await tradingview.serve(port=args.tv_port)
+    telegram = FakeTelegram()
+    tg_runner = await telegram.serve(port=args.tg_port)
+
+    env = dict(os.environ,
+               API_TOKEN="1:loadtest",
+               TELEGRAM_API_URL=f"http://127.0.0.1:{args.tg_port}",
+               TV_WS_URL=f"ws://127.0.0.1:{args.tv_port}",
+               USER_STORE="json",
+               PORT=str(args.metrics_port),
+               SHARD_WORKERS=str(args.shard_workers),
+               TG_GLOBAL_RATE=str(args.global_rate),
+               TG_CHAT_RATE=str(args.chat_rate),
+               TG_DIGEST_WINDOW=str(args.digest_window),
+               LOG_LEVEL=args.log_level)
+    env.pop("BINANCE_API_KEY", None)
+    env.pop("WEBHOOK_URL", None)
+    log = open(os.path.join(workdir, "bot.log"), "w")
+    started = time.monotonic()
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, "bot.py")],
+                               cwd=workdir, env=env, stdout=log,
+                               stderr=subprocess.STDOUT)
+    try:
+        # розігрів: усі сокети відкриваються з TV_CONNECT_RATE
+        while time.monotonic() - started < args.warmup:
+            if process.poll() is not None:
+                raise RuntimeError(f"bot exited with {process.returncode}, "
+                                   f"see {workdir}/bot.log")
+            await asyncio.sleep(0.5)
+
+        mark = len(telegram.sent)
+        signals = tradingview.signals
+        cpu, rss = process_usage(process.pid)
+        peak_rss = rss
+        window = time.monotonic()
+        while time.monotonic() - window < args.duration:
+            await asyncio.sleep(1)
+            peak_rss = max(peak_rss, process_usage(process.pid)[1])
+        elapsed = time.monotonic() - window
+        cpu_end, rss_end = process_usage(process.pid)
+        bot_metrics = await scrape_metrics(args.metrics_port)
+        sent = telegram.sent[mark:]
+        emitted = tradingview.signals - signals
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        log.close()
+        tv_server.close()
+        await tv_server.wait_closed()
+        await telegram.close()
+        await tg_runner.cleanup()
+
+    # час отримання sendMessage - у monotonic фейкового API
+    offset = time.time() - time.monotonic()
+    latencies = sorted(
+        ((received + offset) % 1e5 - stamp) % 1e5
+        for received, _, text in sent for stamp in signal_stamps(text))
+    results = {
+        "streams": bot_metrics.get("hub_streams"),
+        "subscriptions": bot_metrics.get("hub_subscriptions"),
+        "first_send_s": telegram.sent[0][0] - started
+        if telegram.sent else None,
+        "emitted_signals_per_s": emitted / elapsed,
+        "messages_per_s": len(sent) / elapsed,
+        "deliveries_per_s": len(latencies) / elapsed,
+        "latency_p50_ms": _ms(percentile(latencies, 0.5)),
+        "latency_p99_ms": _ms(percentile(latencies, 0.99)),
+        "latency_max_ms": _ms(latencies[-1] if latencies else None),
+        "dropped": bot_metrics.get("telegram_signals_dropped_total", 0),
+        "cpu_percent": (cpu_end - cpu) / elapsed * 100,
+        "rss_mb": rss_end / 2 ** 20,
+        "peak_rss_mb": peak_rss / 2 ** 20,
+    }
+    if args.keep:
+        print(f"work dir: {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--symbols", type=int, default=200)
+    parser.add_argument("--pairs", type=int, default=3,
+                        help="pairs in each user's watchlist")
+    parser.add_argument("--timeframes", default="1,5,15")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--interval", type=float, default=1.0,
+                        help="seconds between bars of every session")
+    parser.add_argument("--heartbeat", type=float, default=10.0)
+    parser.add_argument("--signal-every", type=int, default=5)
+    parser.add_argument("--warmup", type=float, default=15.0)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--shard-workers", type=int, default=0)
+    # ліміти справжнього Telegram тут не цікаві - міряємо сам бот
+    parser.add_argument("--global-rate", type=float, default=1000)
+    parser.add_argument("--chat-rate", type=float, default=1)
+    parser.add_argument("--digest-window", type=float, default=1)
+    parser.add_argument("--tv-port", type=int, default=8765)
+    parser.add_argument("--tg-port", type=int, default=8081)
+    parser.add_argument("--metrics-port", type=int, default=10000)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--json", help="append the run as a JSON line")
+    parser.add_argument("--keep", action="store_true",
+                        help="keep the work dir with users.json and bot.log")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    for name, value in results.items():
+        if isinstance(value, float):
+            value = f"{value:.2f}"
+        print(f"{name:22} {value}")
+
+    if args.json:
+        config = {key: value for key, value in vars(args).items()
+                  if key not in ("json", "keep", "log_level")}
+        with open(args.json, "a") as file:
+            file.write(json.dumps({"revision": git_revision(),
+                                   "time": int(time.time()),
+                                   "config": config,
+                                   "results": results}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,51 +1,195 @@
-import ccxt
-import time
-
-# Укажите API ключи Testnet
-api_key = '8e5474ab68cfecc10d30c5f8353d45511a1bd0bf79509a0f49ec7a640a2611eb'
-api_secret = '96f1bfb069b96fa9773079e1c436135a8153258d7a215dc836b105738243c48a'
-
-# Подключение к Binance Testnet
-binance_testnet = ccxt.binance({
-    'apiKey': api_key,
-    'secret': api_secret,
-    'options': {'defaultType': 'future'},  # Для торговли фьючерсами
-})
-binance_testnet.set_sandbox_mode(True)  # Включаем тестовый режим
-
-# Проверка подключения
-try:
-    balance = binance_testnet.fetch_balance()
-    print("Подключение успешно! Баланс:")
-    print(balance)
-except Exception as e:
-    print(f"Ошибка подключения: {e}")
-    exit()
-
-# Параметры ордера
-symbol = 'EOS/USDT'  # Торговая пара
-order_type = 'market'  # Тип ордера: limit, market и т.д.
-side = 'buy'  # Сторона: buy или sell
-amount = 1000  # Количество для покупки/продажи
-
-# Создание ордера
-try:
-    order = binance_testnet.create_order(
-        symbol=symbol,
-        type=order_type,
-        side=side,
-        amount=amount
-    )
-    print("Ордер создан:")
-    print(order)
-except Exception as e:
-    print(f"Ошибка при создании ордера: {e}")
-
-# Проверка статуса ордера
-try:
-    time.sleep(2)  # Небольшая пауза для обновления статуса
-    order_status = binance_testnet.fetch_order(order['id'], symbol)
-    print("Статус ордера:")
-    print(order_status)
-except Exception as e:
-    print(f"Ошибка при проверке статуса ордера: {e}")
+import asyncio
+import json
+import logging
+import os
+import ccxt.async_support as ccxt
+import websockets
+from tradingview import Backoff
+from metrics import Counter, Histogram
+
+# Ключи и параметры торговли берутся из окружения
+API_KEY = os.getenv("BINANCE_API_KEY")
+API_SECRET = os.getenv("BINANCE_API_SECRET")
+SANDBOX = os.getenv("BINANCE_SANDBOX", "1") == "1"  # Тестовая сеть
+# Торгуемые пары "СИМВОЛ ТАЙМФРЕЙМ" через запятую, как в /add:
+# "BINANCE:EOSUSDT.P 15,BINANCE:BTCUSDT.P 60"
+TRADE_PAIRS = [tuple(pair.split()) for pair in
+               (os.getenv("BINANCE_TRADE_PAIRS") or "").split(",")
+               if pair.strip()]
+ORDER_AMOUNT = float(os.getenv("BINANCE_ORDER_AMOUNT") or 0)
+ORDER_TIMEOUT = float(os.getenv("BINANCE_ORDER_TIMEOUT") or 30)
+USER_STREAM_URL = os.getenv("BINANCE_USER_STREAM_URL") or (
+    "wss://stream.binancefuture.com/ws" if SANDBOX
+    else "wss://fstream.binance.com/ws")
+LISTEN_KEY_KEEPALIVE = 30 * 60
+
+FINAL_STATUSES = ("FILLED", "CANCELED", "EXPIRED", "REJECTED")
+
+logger = logging.getLogger(__name__)
+
+ORDERS = Counter("binance_orders_total", "Orders by final status",
+                 ("status",))
+ORDER_LATENCY = Histogram("binance_order_seconds",
+                          "Time from signal to final order status")
+
+
+# Асинхронное исполнение сигналов: один клиент биржи (одна HTTP-сессия
+# на все ордера), рынки загружаются один раз, статус ордера приходит
+# через user-data websocket вместо sleep + fetch_order. Сигналы идут из
+# собственных подписок на пары (symbol, timeframe), не из чатов
+class OrderExecutor:
+    def __init__(self, api_key=API_KEY, api_secret=API_SECRET,
+                 sandbox=SANDBOX, pairs=TRADE_PAIRS,
+                 amount=ORDER_AMOUNT, user_stream_url=USER_STREAM_URL):
+        self._exchange = ccxt.binance({
+            "apiKey": api_key,
+            "secret": api_secret,
+            "options": {"defaultType": "future"},  # Для торговли фьючерсами
+        })
+        self._exchange.set_sandbox_mode(sandbox)
+        self._pairs = {(symbol, timeframe) for symbol, timeframe in pairs}
+        self._amount = amount
+        self._user_stream_url = user_stream_url
+        self._orders = {}
+        self._early_updates = {}
+        self._tasks = set()
+        self._stream_task = None
+        self._stream_ready = asyncio.Event()
+
+    async def start(self):
+        await self._exchange.load_markets()
+        self._stream_task = asyncio.create_task(self._user_stream())
+
+    @property
+    def pairs(self):
+        return sorted(self._pairs)
+
+    async def close(self):
+        if self._stream_task is not None:
+            self._stream_task.cancel()
+        for task in list(self._tasks):
+            task.cancel()
+        await self._exchange.close()
+
+    def market_for(self, tv_symbol: str):
+        # "BINANCE:EOSUSDT.P" -> рынок ccxt с id "EOSUSDT"
+        market_id = tv_symbol.split(":")[-1].removesuffix(".P")
+        markets = self._exchange.markets_by_id.get(market_id)
+        return markets[0]["symbol"] if markets else None
+
+    def on_signal(self, symbol, timeframe, signal, close):
+        if (symbol, timeframe) not in self._pairs or not self._amount:
+            return
+        task = asyncio.create_task(self.execute(symbol, signal))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def execute(self, tv_symbol: str, signal: str):
+        symbol = self.market_for(tv_symbol)
+        if symbol is None:
+            logger.warning("No Binance market for %s", tv_symbol)
+            return None
+        side = "buy" if signal == "Long" else "sell"
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+
+        try:
+            order = await self._exchange.create_order(
+                symbol=symbol, type="market", side=side, amount=self._amount)
+        except ccxt.BaseError as e:
+            ORDERS.inc("ERROR")
+            logger.error("Order %s %s failed: %s", side, symbol, e)
+            return None
+
+        order_id = str(order["id"])
+        status = self._early_updates.pop(order_id, None)
+        if status is None and not self._stream_ready.is_set():
+            # ордер не ждёт user stream: без него статус только запросом
+            logger.warning("User stream is down, polling %s status",
+                           order_id)
+            status = await self._fetch_status(order_id, symbol)
+        if status is None:
+            future = self._orders[order_id] = loop.create_future()
+            try:
+                status = await asyncio.wait_for(future, ORDER_TIMEOUT)
+            except asyncio.TimeoutError:
+                status = await self._fetch_status(order_id, symbol)
+            finally:
+                self._orders.pop(order_id, None)
+
+        ORDERS.inc(status)
+        ORDER_LATENCY.observe(loop.time() - started)
+        logger.info("Order %s %s %s: %s", order_id, side, symbol, status)
+        return status
+
+    async def _fetch_status(self, order_id, symbol):
+        try:
+            order = await self._exchange.fetch_order(order_id, symbol)
+        except ccxt.BaseError as e:
+            logger.error("Order %s status check failed: %s", order_id, e)
+            return "UNKNOWN"
+        return (order.get("info") or {}).get("status") or "UNKNOWN"
+
+    def _handle_user_event(self, event):
+        if event.get("e") != "ORDER_TRADE_UPDATE":
+            return
+        order = event["o"]
+        status = order["X"]
+        if status not in FINAL_STATUSES:
+            return
+        order_id = str(order["i"])
+        future = self._orders.get(order_id)
+        if future is not None:
+            if not future.done():
+                future.set_result(status)
+        else:
+            # событие пришло раньше ответа на create_order
+            self._early_updates[order_id] = status
+            if len(self._early_updates) > 1000:
+                self._early_updates.pop(next(iter(self._early_updates)))
+
+    async def _user_stream(self):
+        backoff = Backoff()
+        while True:
+            keepalive = None
+            try:
+                response = await self._exchange.fapiPrivatePostListenKey()
+                url = f"{self._user_stream_url}/{response['listenKey']}"
+                async with websockets.connect(url) as websocket:
+                    keepalive = asyncio.create_task(self._keepalive())
+                    self._stream_ready.set()
+                    backoff.reset()
+                    async for message in websocket:
+                        self._handle_user_event(json.loads(message))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Binance user stream error: %s", e)
+            finally:
+                self._stream_ready.clear()
+                if keepalive is not None:
+                    keepalive.cancel()
+            await asyncio.sleep(backoff.next_delay())
+
+    async def _keepalive(self):
+        while True:
+            await asyncio.sleep(LISTEN_KEY_KEEPALIVE)
+            await self._exchange.fapiPrivatePutListenKey()
+
+
+async def main():
+    # Разовый ордер, как в прежней версии скрипта
+    logging.basicConfig(level=logging.INFO)
+    executor = OrderExecutor(amount=ORDER_AMOUNT or 1000)
+    try:
+        await executor.start()
+        balance = await executor._exchange.fetch_balance()
+        print("Подключение успешно! Баланс:")
+        print(balance)
+        print(await executor.execute("BINANCE:EOSUSDT", "Long"))
+    finally:
+        await executor.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
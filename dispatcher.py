@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import os
+from time import monotonic
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from metrics import Gauge, Histogram, Counter
+from ratelimit import TokenBucket
+
+GLOBAL_RATE = float(os.getenv("TG_GLOBAL_RATE") or 30)
+CHAT_RATE = float(os.getenv("TG_CHAT_RATE") or 1)
+SEND_WORKERS = int(os.getenv("TG_SEND_WORKERS") or 8)
+SIGNAL_MAX_AGE = float(os.getenv("TG_SIGNAL_MAX_AGE") or 300)
+# скільки чекати інші сигнали того ж бару перед першим надсиланням у чат
+DIGEST_WINDOW = float(os.getenv("TG_DIGEST_WINDOW") or 1)
+
+logger = logging.getLogger(__name__)
+
+QUEUE_DEPTH = Gauge("telegram_queue_depth",
+                    "Chats with signals waiting to be sent")
+SEND_LATENCY = Histogram("telegram_send_latency_seconds",
+                         "Time from signal to delivered Telegram message")
+SENT = Counter("telegram_messages_sent_total", "Messages sent to Telegram")
+DROPPED = Counter("telegram_signals_dropped_total",
+                  "Signals dropped before sending", ("reason",))
+RETRIES = Counter("telegram_retry_after_total",
+                  "Sends postponed because of a 429 retry_after")
+
+
+# Центральна черга вихідних сигналів: пул воркерів надсилає їх з
+# урахуванням глобального та per-chat лімітів Telegram. Поки сигнал
+# чекає у черзі, новіший сигнал того ж потоку для того ж чату його
+# замінює, а кілька потоків одного чату йдуть одним повідомленням
+class SignalDispatcher:
+    def __init__(self, bot, workers=SEND_WORKERS, global_rate=GLOBAL_RATE,
+                 chat_rate=CHAT_RATE, max_age=SIGNAL_MAX_AGE,
+                 on_forbidden=None, digest_window=DIGEST_WINDOW,
+                 format_digest="\n".join):
+        self._bot = bot
+        self._digest_window = digest_window
+        # format_digest(texts) збирає сигнали чату в одне повідомлення
+        self._format_digest = format_digest
+        # await on_forbidden(chat_id), коли чат заблокував бота
+        self._on_forbidden = on_forbidden
+        self._workers = workers
+        self._global_bucket = TokenBucket(global_rate)
+        self._chat_rate = chat_rate
+        self._chat_buckets = {}
+        self._max_age = max_age
+        self._queue = asyncio.Queue()
+        self._pending = {}
+        self._sending = set()
+        self._queued = set()
+        self._tasks = []
+
+    @property
+    def depth(self):
+        return len(self._pending)
+
+    def start(self):
+        for _ in range(self._workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+
+    def submit(self, chat_id, key, text: str, created=None):
+        first = chat_id not in self._pending
+        chat_pending = self._pending.setdefault(chat_id, {})
+        if key in chat_pending:
+            DROPPED.inc("merged")
+        chat_pending[key] = (text, created or monotonic())
+        QUEUE_DEPTH.set(len(self._pending))
+        if chat_id in self._sending:
+            return
+        if first and self._digest_window:
+            self._enqueue_later(chat_id, self._digest_window)
+        else:
+            self._enqueue(chat_id)
+
+    def _enqueue(self, chat_id):
+        if chat_id not in self._queued:
+            self._queued.add(chat_id)
+            self._queue.put_nowait(chat_id)
+
+    def _enqueue_later(self, chat_id, delay):
+        if chat_id not in self._queued:
+            self._queued.add(chat_id)
+            asyncio.get_running_loop().call_later(
+                delay, self._queue.put_nowait, chat_id)
+
+    def _requeue(self, chat_id, items):
+        # новіші сигнали, що прийшли під час надсилання, мають пріоритет
+        chat_pending = self._pending.setdefault(chat_id, {})
+        for key, item in items.items():
+            chat_pending.setdefault(key, item)
+        QUEUE_DEPTH.set(len(self._pending))
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 10000:
+                self._chat_buckets = {k: v for k, v in
+                                      self._chat_buckets.items()
+                                      if not v.full}
+            bucket = self._chat_buckets[chat_id] = TokenBucket(
+                self._chat_rate)
+        return bucket
+
+    async def _worker(self):
+        while True:
+            chat_id = await self._queue.get()
+            self._queued.discard(chat_id)
+            if chat_id not in self._pending or chat_id in self._sending:
+                continue
+
+            # чат ще не може отримати повідомлення - відкладаємо, не
+            # займаючи воркер
+            delay = self._chat_bucket(chat_id).delay()
+            if delay:
+                self._enqueue_later(chat_id, delay)
+                continue
+
+            self._sending.add(chat_id)
+            try:
+                await self._send(chat_id)
+            except Exception:
+                logger.exception("Failed to send signals to %s", chat_id)
+            finally:
+                self._sending.discard(chat_id)
+                if chat_id in self._pending:
+                    self._enqueue(chat_id)
+
+    async def _send(self, chat_id):
+        bucket = self._chat_bucket(chat_id)
+        await bucket.acquire()
+        await self._global_bucket.acquire()
+
+        items = self._pending.pop(chat_id, None)
+        QUEUE_DEPTH.set(len(self._pending))
+        if not items:
+            return
+        now = monotonic()
+        fresh = {key: item for key, item in items.items()
+                 if now - item[1] <= self._max_age}
+        if len(fresh) < len(items):
+            DROPPED.inc("stale", amount=len(items) - len(fresh))
+        if not fresh:
+            return
+
+        text = self._format_digest([item[0] for item in fresh.values()])
+        try:
+            await self._bot.send_message(chat_id, text)
+        except TelegramRetryAfter as e:
+            RETRIES.inc()
+            bucket.block(e.retry_after)
+            self._requeue(chat_id, fresh)
+            return
+        except TelegramForbiddenError:
+            DROPPED.inc("forbidden", amount=len(fresh))
+            if self._on_forbidden is not None:
+                await self._on_forbidden(chat_id)
+            return
+
+        SENT.inc()
+        now = monotonic()
+        for _, created in fresh.values():
+            SEND_LATENCY.observe(now - created)
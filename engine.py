@@ -0,0 +1,171 @@
+from collections import namedtuple
+import numpy as np
+
+# Ті самі входи, що й in_0..in_7 у study "Script@tv-scripting-101!".
+# Джерело Pine-скрипта зашифроване, тому локальний рушій реалізує
+# власну стратегію на цих параметрах:
+#   fast_length     in_0  EMA джерела
+#   signal_length   in_1  EMA осцилятора (сигнальна лінія)
+#   threshold       in_2  мінімальний крок осцилятора на барі перетину,
+#                         у % від ATR
+#   heikin_ashi     in_3  рахувати по свічках Heikin Ashi
+#   band_mult       in_4  ширина смуги стандартних відхилень від basis
+#   cooldown        in_5  мінімум барів між сигналами одного напрямку
+#   basis_length    in_6  SMA basis і вікно стандартного відхилення
+#   atr_length      in_7  ATR (згладжування Уайлдера)
+StudyParams = namedtuple("StudyParams", [
+    "fast_length", "signal_length", "threshold", "heikin_ashi",
+    "band_mult", "cooldown", "basis_length", "atr_length"])
+
+DEFAULT_PARAMS = StudyParams(8, 8, 25, False, 2, 5, 20, 10)
+
+MAX_LENGTH = 1000
+
+
+def check_params(params) -> StudyParams:
+    params = StudyParams(*params)
+    for length in (params.fast_length, params.signal_length,
+                   params.basis_length, params.atr_length):
+        if not 1 <= length <= MAX_LENGTH:
+            raise ValueError(f"Length out of range: {params}")
+    if params.cooldown < 0 or params.threshold < 0 or params.band_mult <= 0:
+        raise ValueError(f"Invalid params: {params}")
+    return params
+
+
+# Інкрементальний рушій сигналів: один потік барів, будь-яка кількість
+# наборів параметрів. Стан кожного індикатора - numpy-масив по наборах,
+# тож кожен новий бар оновлює всі набори за O(1) векторних операцій
+class SignalEngine:
+    def __init__(self, params_list=(DEFAULT_PARAMS,)):
+        self._params = []
+        self._size = MAX_LENGTH + 1
+        # кумулятивні суми (x - ref) та (x - ref)^2 для звичайних і HA цін
+        self._cum = np.zeros((4, self._size))
+        self._ref = None
+        self._count = 0
+        self._prev_close = None
+        self._ha_open = None
+        self._ha_close = None
+
+        self._fast_alpha = np.empty(0)
+        self._signal_alpha = np.empty(0)
+        self._threshold = np.empty(0)
+        self._heikin = np.empty(0, dtype=bool)
+        self._band_mult = np.empty(0)
+        self._cooldown = np.empty(0)
+        self._basis_length = np.empty(0, dtype=np.int64)
+        self._atr_length = np.empty(0)
+        self._warmup = np.empty(0, dtype=np.int64)
+
+        self._bars = np.empty(0, dtype=np.int64)
+        self._fast = np.empty(0)
+        self._osc = np.empty(0)
+        self._signal = np.empty(0)
+        self._atr = np.empty(0)
+        self._last_long = np.empty(0, dtype=np.int64)
+        self._last_short = np.empty(0, dtype=np.int64)
+
+        for params in params_list:
+            self.add_params(params)
+
+    def __len__(self):
+        return len(self._params)
+
+    @property
+    def params(self):
+        return list(self._params)
+
+    def add_params(self, params: StudyParams) -> int:
+        params = check_params(params)
+        self._params.append(params)
+        index = len(self._params) - 1
+
+        def append(name, value):
+            array = getattr(self, name)
+            setattr(self, name, np.append(array, value).astype(array.dtype))
+
+        append("_fast_alpha", 2 / (params.fast_length + 1))
+        append("_signal_alpha", 2 / (params.signal_length + 1))
+        append("_threshold", params.threshold)
+        append("_heikin", bool(params.heikin_ashi))
+        append("_band_mult", params.band_mult)
+        append("_cooldown", params.cooldown)
+        append("_basis_length", int(params.basis_length))
+        append("_atr_length", params.atr_length)
+        append("_warmup", int(max(params.fast_length, params.basis_length,
+                                  params.atr_length) + params.signal_length))
+
+        append("_bars", 0)
+        append("_fast", np.nan)
+        append("_osc", np.nan)
+        append("_signal", np.nan)
+        append("_atr", np.nan)
+        append("_last_long", -MAX_LENGTH)
+        append("_last_short", -MAX_LENGTH)
+        return index
+
+    def update(self, open_, high, low, close):
+        # Додає закритий бар; повертає масиви long/short по наборах
+        if self._ref is None:
+            self._ref = close
+        if self._ha_open is None:
+            ha_open = (open_ + close) / 2
+        else:
+            ha_open = (self._ha_open + self._ha_close) / 2
+        ha_close = (open_ + high + low + close) / 4
+        self._ha_open, self._ha_close = ha_open, ha_close
+
+        if self._prev_close is None:
+            true_range = high - low
+        else:
+            true_range = max(high - low, abs(high - self._prev_close),
+                             abs(low - self._prev_close))
+        self._prev_close = close
+
+        prev_slot = self._count % self._size
+        self._count += 1
+        slot = self._count % self._size
+        x = close - self._ref
+        ha_x = ha_close - self._ref
+        self._cum[:, slot] = self._cum[:, prev_slot] + (x, x * x,
+                                                        ha_x, ha_x * ha_x)
+
+        heikin = self._heikin
+        src = np.where(heikin, ha_close, close)
+
+        length = np.minimum(self._basis_length, self._count)
+        start = (self._count - length) % self._size
+        sums = self._cum[:, slot, None] - self._cum[:, start]
+        total = np.where(heikin, sums[2], sums[0])
+        total_sq = np.where(heikin, sums[3], sums[1])
+        mean = total / length
+        basis = mean + self._ref
+        std = np.sqrt(np.maximum(total_sq / length - mean * mean, 0))
+
+        first = self._bars == 0
+        fast = np.where(first, src,
+                        self._fast + self._fast_alpha * (src - self._fast))
+        osc = fast - basis
+        signal = np.where(first, osc,
+                          self._signal + self._signal_alpha *
+                          (osc - self._signal))
+        atr = np.where(first, true_range,
+                       self._atr + (true_range - self._atr) /
+                       self._atr_length)
+
+        prev_osc, prev_signal = self._osc, self._signal
+        self._bars += 1
+        self._fast, self._osc, self._signal, self._atr = fast, osc, signal, atr
+
+        ready = self._bars > self._warmup
+        strong = np.abs(osc - prev_osc) * 100 >= self._threshold * atr
+        long_ = (ready & strong & (prev_osc <= prev_signal) & (osc > signal)
+                 & (src <= basis + self._band_mult * std)
+                 & (self._bars - self._last_long > self._cooldown))
+        short = (ready & strong & (prev_osc >= prev_signal) & (osc < signal)
+                 & (src >= basis - self._band_mult * std)
+                 & (self._bars - self._last_short > self._cooldown))
+        self._last_long = np.where(long_, self._bars, self._last_long)
+        self._last_short = np.where(short, self._bars, self._last_short)
+        return long_, short
@@ -0,0 +1,401 @@
+import asyncio
+import logging
+import os
+from time import monotonic
+from tradingview import (TradingViewConnection, TradingViewMultiConnection,
+                         Study, PEAK_SOCKETS)
+from engine import StudyParams, DEFAULT_PARAMS
+from ratelimit import TokenBucket
+from metrics import Counter, Gauge
+
+SESSIONS_PER_SOCKET = int(os.getenv("TV_SESSIONS_PER_SOCKET") or 50)
+# нові сокети (і перепідключення) на секунду та одночасні handshake-и
+CONNECT_RATE = float(os.getenv("TV_CONNECT_RATE") or 2)
+CONNECT_CONCURRENCY = int(os.getenv("TV_CONNECT_CONCURRENCY") or 4)
+# перевірка здоров'я: сокет без жодного кадру (навіть серцебиття) і
+# study без даних довше за ці інтервали вважаються завислими
+HEALTH_INTERVAL = float(os.getenv("TV_HEALTH_INTERVAL") or 5)
+SOCKET_STALL = float(os.getenv("TV_SOCKET_STALL") or 60)
+STREAM_STALL = float(os.getenv("TV_STREAM_STALL") or 300)
+# кожен наступний перезапуск сесії поспіль без даних чекає вдвічі
+# довше, але не більше TV_STREAM_RESTART_MAX; після стількох таких
+# перезапусків потік завислий і в паузі між ними
+STREAM_RESTART_MAX = float(os.getenv("TV_STREAM_RESTART_MAX") or 3600)
+STREAM_RESTARTS_STALLED = 2
+
+logger = logging.getLogger(__name__)
+
+STREAMS = Gauge("hub_streams", "Upstream (symbol, timeframe) streams")
+SUBSCRIPTIONS = Gauge("hub_subscriptions", "Chat subscriptions to streams")
+HIBERNATING = Gauge("hub_streams_hibernating",
+                    "Streams without active subscribers, socket closed")
+FIRST_SIGNAL = Gauge("hub_first_signal_seconds",
+                     "Time from hub start to the first signal")
+STALLED = Gauge("hub_streams_stalled",
+                "Awake streams without data at the last health check")
+RECYCLES = Counter("hub_recycles_total",
+                   "Stalled sockets and sessions recreated",
+                   ("kind",))
+
+
+class Stream:
+    def __init__(self, symbol: str, timeframe: str, params=DEFAULT_PARAMS):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.params = params
+        self.study = None
+        self.connection = None
+        self.subscribers = set()
+        # не чати (виконання ордерів): отримують кожен сигнал і тримають
+        # потік відкритим незалежно від підписників
+        self.listeners = []
+        self.socket = None
+        self.hibernating = False
+
+
+class ConnectLimiter:
+    def __init__(self, rate=CONNECT_RATE, concurrency=CONNECT_CONCURRENCY):
+        self._bucket = TokenBucket(rate, 1)
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def acquire(self):
+        await self._semaphore.acquire()
+        try:
+            await self._bucket.acquire()
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    def release(self):
+        self._semaphore.release()
+
+
+class Socket:
+    def __init__(self, limiter=None):
+        self.connection = TradingViewMultiConnection(limiter=limiter)
+        self.task = None
+
+
+# Потік - (symbol, timeframe, параметри study). Потоки з однаковими
+# (symbol, timeframe) ділять одну chart-сесію TradingView і відрізняються
+# лише study на ній; до SESSIONS_PER_SOCKET сесій на одному websocket;
+# сигнали розсилаються всім підписаним чатам. Потік, усі підписники
+# якого неактивні (вимкнули сигнали або заблокували бота), засинає:
+# сесія закривається, але потік і його стан лишаються до пробудження
+class SubscriptionHub:
+    def __init__(self, on_signal, sessions_per_socket=SESSIONS_PER_SOCKET,
+                 limiter=None):
+        self._on_signal = on_signal
+        self._sessions_per_socket = sessions_per_socket
+        self._limiter = limiter or ConnectLimiter()
+        self._streams = {}
+        self._connections = {}
+        self._sockets = []
+        self._subscriptions = 0
+        self._hibernating = 0
+        self._inactive = set()
+        self._started = None
+        self._first_signal = None
+        self._watchdog = None
+
+    def start(self):
+        self._started = monotonic()
+        self._watchdog = asyncio.create_task(self._watch())
+
+    async def add_listener(self, listener, symbol: str, timeframe: str,
+                           params=DEFAULT_PARAMS):
+        # Власна підписка не-чату на (symbol, timeframe, params):
+        # listener(symbol, timeframe, signal, close) викликається один раз
+        # на сигнал, а потік не засинає, хоч би що робили чати
+        stream = self._get_stream(symbol, timeframe, params)
+        stream.listeners.append(listener)
+        await self._update_hibernation(stream)
+        self._update_gauges()
+        return stream
+
+    @property
+    def streams(self):
+        return self._streams
+
+    @property
+    def sockets(self):
+        return self._sockets
+
+    def _get_stream(self, symbol, timeframe, params):
+        params = StudyParams(*params)
+        key = (symbol, timeframe, params)
+        stream = self._streams.get(key)
+        if stream is None:
+            stream = Stream(symbol, timeframe, params)
+            stream.hibernating = True
+            self._hibernating += 1
+            self._streams[key] = stream
+        return stream
+
+    async def subscribe(self, chat_id, symbol: str, timeframe: str,
+                        params=DEFAULT_PARAMS):
+        stream = self._get_stream(symbol, timeframe, params)
+        if chat_id not in stream.subscribers:
+            stream.subscribers.add(chat_id)
+            self._subscriptions += 1
+        await self._update_hibernation(stream)
+        self._update_gauges()
+        return stream
+
+    async def unsubscribe(self, chat_id, symbol: str, timeframe: str,
+                          params=DEFAULT_PARAMS):
+        key = (symbol, timeframe, StudyParams(*params))
+        stream = self._streams.get(key)
+        if stream is None or chat_id not in stream.subscribers:
+            return
+        stream.subscribers.discard(chat_id)
+        self._subscriptions -= 1
+        if not stream.subscribers and not stream.listeners:
+            del self._streams[key]
+            if stream.hibernating:
+                self._hibernating -= 1
+            else:
+                await self._close_stream(stream)
+        else:
+            await self._update_hibernation(stream)
+        self._update_gauges()
+
+    async def set_active(self, chat_id, active: bool):
+        if active:
+            self._inactive.discard(chat_id)
+        else:
+            self._inactive.add(chat_id)
+        for stream in list(self._streams.values()):
+            if chat_id in stream.subscribers:
+                await self._update_hibernation(stream)
+        self._update_gauges()
+
+    async def _update_hibernation(self, stream: Stream):
+        awake = bool(stream.listeners) or \
+            not stream.subscribers.issubset(self._inactive)
+        if awake and stream.hibernating:
+            stream.hibernating = False
+            self._hibernating -= 1
+            await self._open_stream(stream)
+        elif not awake and not stream.hibernating:
+            stream.hibernating = True
+            self._hibernating += 1
+            await self._close_stream(stream)
+            stream.socket = None
+
+    async def _open_stream(self, stream: Stream):
+        # study (і стан сигналів) належить потоку і переживає сон
+        if stream.study is None:
+            stream.study = Study(stream.params)
+        series = (stream.symbol, stream.timeframe)
+        shared = self._connections.get(series)
+        if shared is None:
+            connection = TradingViewConnection(stream.symbol,
+                                               stream.timeframe, params=None)
+            connection.add_study(stream.study)
+            socket = self._get_socket()
+            self._connections[series] = (connection, socket)
+            await socket.connection.add_session(connection)
+        else:
+            # інші параметри на тій самій серії - лише ще один study
+            connection, socket = shared
+            await socket.connection.add_study(connection, stream.study)
+        stream.connection = connection
+        stream.socket = socket
+
+    async def _close_stream(self, stream: Stream):
+        connection, socket = stream.connection, stream.socket
+        if len(connection.studies) > 1:
+            await socket.connection.remove_study(connection, stream.study)
+            return
+        connection.remove_study(stream.study)
+        del self._connections[(stream.symbol, stream.timeframe)]
+        await socket.connection.remove_session(connection)
+        if not len(socket.connection):
+            self._sockets.remove(socket)
+            socket.task.cancel()
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(HEALTH_INTERVAL)
+            try:
+                await self.check_health()
+            except Exception:
+                logger.exception("Health check failed")
+
+    async def check_health(self):
+        # Мовчазний сокет перепідключається цілком; сесія, study якої
+        # перестав отримувати du при живому сокеті, перестворюється
+        now = monotonic()
+        stalled = 0
+        for socket in list(self._sockets):
+            multi = socket.connection
+            if not multi.connected:
+                continue
+            if now - multi.last_frame > SOCKET_STALL:
+                logger.warning("TradingView socket silent for %.0fs, "
+                               "reconnecting", now - multi.last_frame)
+                RECYCLES.inc("socket")
+                await multi.recycle()
+                continue
+            for connection in multi.sessions:
+                stalled += sum(_stalled(study, now)
+                               for study in connection.studies)
+                studies = [study for study in connection.studies
+                           if study.silent_for(now) >
+                           _restart_delay(study.idle_restarts)]
+                if not studies:
+                    continue
+                logger.warning("No data for %s %s for %.0fs after %d "
+                               "restarts, recreating the session",
+                               connection.symbol, connection.timeframe,
+                               max(s.silent_for(now) for s in studies),
+                               max(s.idle_restarts for s in studies))
+                for study in connection.studies:
+                    study.restarts = study.idle_restarts + 1 \
+                        if study in studies else 0
+                RECYCLES.inc("session")
+                await multi.restart_session(connection)
+        STALLED.set(stalled)
+
+    def health(self, streams=False):
+        # Знімок для /health: сокети і потоки з віком останніх даних;
+        # streams=False - лише потоки з проблемами
+        now = monotonic()
+        return self._health_report(
+            [self._socket_health(socket.connection, now)
+             for socket in self._sockets],
+            [self._stream_health(stream, now)
+             for stream in self._streams.values()], streams)
+
+    def _health_report(self, sockets, entries, streams):
+        return {
+            "ok": all(socket["connected"] for socket in sockets) and
+            not any(entry["stalled"] for entry in entries),
+            "streams_total": len(entries),
+            "streams_stalled": sum(entry["stalled"] for entry in entries),
+            "hibernating": self._hibernating,
+            "sockets": sockets,
+            "streams": [entry for entry in entries
+                        if streams or entry["stalled"]],
+        }
+
+    @staticmethod
+    def _socket_health(multi, now):
+        return {
+            "connected": multi.connected,
+            "sessions": len(multi),
+            "last_frame_age": _age(multi.last_frame, now),
+            "last_heartbeat_age": _age(multi.last_heartbeat, now),
+            "reconnects": multi.reconnects,
+        }
+
+    def _stream_health(self, stream: Stream, now):
+        # поки сокет перепідключається, потік не завислий, а відключений;
+        # потік, що заснув ще до відкриття, не має study
+        study = stream.study
+        connected = not stream.hibernating and stream.socket is not None \
+            and stream.socket.connection.connected
+        return {
+            "symbol": stream.symbol,
+            "timeframe": stream.timeframe,
+            "params": list(stream.params),
+            "subscribers": len(stream.subscribers),
+            "hibernating": stream.hibernating,
+            "connected": connected,
+            "last_data_age": _age(study.last_data, now)
+            if study is not None else None,
+            "recycles": stream.connection.recycles
+            if stream.connection is not None else 0,
+            "restarts": study.idle_restarts if study is not None else 0,
+            "stalled": connected and study is not None and
+            _stalled(study, now),
+        }
+
+    def _update_gauges(self):
+        STREAMS.set(len(self._streams))
+        SUBSCRIPTIONS.set(self._subscriptions)
+        HIBERNATING.set(self._hibernating)
+
+    def _get_socket(self):
+        for socket in self._sockets:
+            if len(socket.connection) < self._sessions_per_socket:
+                return socket
+        socket = Socket(self._limiter)
+        self._sockets.append(socket)
+        socket.task = asyncio.create_task(self._run_socket(socket))
+        return socket
+
+    async def _run_socket(self, socket: Socket):
+        async for study, signal, close in \
+                socket.connection.connect_and_send():
+            connection = study.connection
+            if connection is None:
+                continue
+            stream = self._streams.get(
+                (connection.symbol, connection.timeframe, study.params))
+            if stream is not None and stream.study is study:
+                await self._dispatch(stream, signal, close)
+
+        # сокет закрився - його потоки більше не отримують даних
+        if socket in self._sockets:
+            self._sockets.remove(socket)
+        for series, (_, series_socket) in list(self._connections.items()):
+            if series_socket is socket:
+                del self._connections[series]
+        for key, stream in list(self._streams.items()):
+            if stream.socket is socket:
+                del self._streams[key]
+                self._subscriptions -= len(stream.subscribers)
+        self._update_gauges()
+
+    async def _dispatch(self, stream: Stream, signal, close):
+        if self._first_signal is None and self._started is not None:
+            self._first_signal = monotonic() - self._started
+            FIRST_SIGNAL.set(self._first_signal)
+            logger.info("First signal %.1fs after start, peak open "
+                        "sockets %d", self._first_signal,
+                        PEAK_SOCKETS.value())
+        for listener in stream.listeners:
+            try:
+                listener(stream.symbol, stream.timeframe, signal, close)
+            except Exception:
+                logger.exception("Signal listener failed")
+        for chat_id in tuple(stream.subscribers):
+            if chat_id in self._inactive:
+                continue
+            try:
+                await self._on_signal(chat_id, stream.symbol,
+                                      stream.timeframe, signal, close,
+                                      stream.params)
+            except Exception:
+                logger.exception("Failed to deliver signal to %s", chat_id)
+
+    async def close(self):
+        if self._watchdog is not None:
+            self._watchdog.cancel()
+            self._watchdog = None
+        for socket in self._sockets:
+            socket.task.cancel()
+        self._sockets.clear()
+        self._streams.clear()
+        self._connections.clear()
+        self._subscriptions = 0
+        self._hibernating = 0
+        self._update_gauges()
+
+
+def _restart_delay(restarts):
+    return min(STREAM_STALL * 2 ** min(restarts, 16),
+               max(STREAM_RESTART_MAX, STREAM_STALL))
+
+
+def _stalled(study, now):
+    # без даних довше STREAM_STALL від (пере)запуску сесії або кілька
+    # перезапусків поспіль так і не дали даних
+    return study.silent_for(now) > STREAM_STALL or \
+        study.idle_restarts >= STREAM_RESTARTS_STALLED
+
+
+def _age(moment, now):
+    return None if moment is None else round(now - moment, 1)
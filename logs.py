@@ -0,0 +1,30 @@
+import logging
+import os
+
+LOG_LEVEL = os.getenv("LOG_LEVEL") or "INFO"
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY") or 100)
+
+
+# Пропускає лише кожен every-й запис: для логів на кожен кадр
+class SampleFilter(logging.Filter):
+    def __init__(self, every: int):
+        super().__init__()
+        self._every = max(every, 1)
+        self._count = 0
+
+    def filter(self, record):
+        self._count += 1
+        return self._count % self._every == 1 or self._every == 1
+
+
+def setup_logging():
+    logging.basicConfig(
+        level=LOG_LEVEL,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+
+def get_sampled_logger(name: str, every: int = LOG_SAMPLE_EVERY):
+    logger = logging.getLogger(name)
+    if not any(isinstance(f, SampleFilter) for f in logger.filters):
+        logger.addFilter(SampleFilter(every))
+    return logger
@@ -0,0 +1,123 @@
+REGISTRY = []
+# Знімки реєстрів воркерів шардингу: {номер воркера: {метрика: значення}};
+# render додає їх до метрик процесу бота з міткою worker
+REMOTE = {}
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        REGISTRY.append(self)
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def items(self):
+        return self._values.items()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        self._values[labels] = value
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def remove(self, *labels):
+        self._values.pop(labels, None)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames=(),
+                 buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                          2.5, 5.0, 10.0)):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        state = self._values.get(labels)
+        if state is None:
+            # [лічильники по бакетах..., сума, кількість]
+            state = self._values[labels] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[i] += 1
+        state[-2] += value
+        state[-1] += 1
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"')
+               .replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"'
+                          for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def snapshot(exclude=()):
+    # значення всіх метрик процесу для передачі в інший процес
+    return {metric.name: {labels: list(value) if isinstance(value, list)
+                          else value for labels, value in metric.items()}
+            for metric in REGISTRY if metric.name not in exclude}
+
+
+def set_remote(worker, values):
+    REMOTE[worker] = values
+
+
+def remove_remote(worker):
+    REMOTE.pop(worker, None)
+
+
+def render(registry=None) -> str:
+    # Текстовий формат експозиції Prometheus
+    lines = []
+    for metric in REGISTRY if registry is None else registry:
+        name = metric.name
+        lines.append(f"# HELP {name} {metric.help_text}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        items = [(metric.labelnames, labels, value)
+                 for labels, value in metric.items()]
+        for worker, values in sorted(REMOTE.items()):
+            items.extend((metric.labelnames + ("worker",),
+                          labels + (worker,), value)
+                         for labels, value in values.get(name, {}).items())
+        if not items and not metric.labelnames and \
+                metric.kind != "histogram":
+            items = [((), (), 0)]
+        for names, labels, value in items:
+            if metric.kind != "histogram":
+                lines.append(f"{name}{_format_labels(names, labels)} {value}")
+                continue
+            for bound, count in zip(metric.buckets + ("+Inf",),
+                                    value[:-2] + [value[-1]]):
+                bucket_labels = _format_labels(names, labels, ("le", bound))
+                lines.append(f"{name}_bucket{bucket_labels} {count}")
+            lines.append(f"{name}_sum{_format_labels(names, labels)} "
+                         f"{value[-2]}")
+            lines.append(f"{name}_count{_format_labels(names, labels)} "
+                         f"{value[-1]}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,102 @@
+import sys
+from engine import StudyParams, DEFAULT_PARAMS
+
+TIMEFRAMES = [
+    {"display": "1 минута", "code": "1"},
+    {"display": "3 минуты", "code": "3"},
+    {"display": "5 минут", "code": "5"},
+    {"display": "15 минут", "code": "15"},
+    {"display": "30 минут", "code": "30"},
+    {"display": "45 минут", "code": "45"},
+    {"display": "1 час", "code": "60"},
+    {"display": "2 часа", "code": "120"},
+    {"display": "3 часа", "code": "180"},
+    {"display": "4 часа", "code": "240"},
+    {"display": "1 день", "code": "1D"},
+    {"display": "1 неделя", "code": "1W"},
+    {"display": "1 месяц", "code": "1M"},
+    {"display": "3 месяца", "code": "3M"},
+    {"display": "6 месяцев", "code": "6M"},
+    {"display": "12 месяцев", "code": "12M"}
+]
+TIMEFRAME_INDEX = {tf["code"]: index for index, tf in enumerate(TIMEFRAMES)}
+
+# Однакові пари і набори параметрів у різних чатах - це ті самі об'єкти:
+# користувач тримає лише посилання на них
+_pairs = {}
+_params = {}
+
+
+def make_pair(symbol: str, code: str):
+    # (символ, індекс таймфрейму в TIMEFRAMES)
+    key = (symbol, code)
+    pair = _pairs.get(key)
+    if pair is None:
+        pair = _pairs[key] = (sys.intern(symbol), TIMEFRAME_INDEX[code])
+    return pair
+
+
+def pair_code(pair):
+    return TIMEFRAMES[pair[1]]["code"]
+
+
+def make_params(values):
+    # None для DEFAULT_PARAMS, щоб не зберігати їх у кожному записі
+    if not values:
+        return None
+    params = StudyParams(*values)
+    if params == DEFAULT_PARAMS:
+        return None
+    return _params.setdefault(params, params)
+
+
+# Стан чату в пам'яті. Записи сховища (json) - лише через from_record
+# і to_record; формат записів той самий, що й раніше
+class User:
+    __slots__ = ("watchlist", "params", "muted", "active")
+
+    def __init__(self, watchlist=None, params=None, muted=False,
+                 active=True):
+        self.watchlist = watchlist if watchlist is not None else []
+        self.params = params
+        self.muted = muted
+        self.active = active
+
+    @property
+    def listening(self):
+        # вимкнені сигнали або заблокований бот - потоки користувача сплять
+        return not self.muted and self.active
+
+    @property
+    def study_params(self):
+        return self.params or DEFAULT_PARAMS
+
+    def pairs(self):
+        # (символ, код таймфрейму) для хаба
+        return [(symbol, TIMEFRAMES[index]["code"])
+                for symbol, index in self.watchlist]
+
+    @classmethod
+    def from_record(cls, data: dict):
+        watchlist = data.get("watchlist")
+        if watchlist is None:
+            # старий формат: одна пара currency + timeframe замість списку
+            currency = data.get("currency")
+            timeframe = data.get("timeframe")
+            watchlist = [[currency, timeframe["code"]]] \
+                if currency and timeframe else []
+        return cls([make_pair(symbol, code) for symbol, code in watchlist
+                    if code in TIMEFRAME_INDEX],
+                   make_params(data.get("params")),
+                   bool(data.get("muted")), data.get("active", True))
+
+    def to_record(self):
+        record = {"watchlist": [[symbol, TIMEFRAMES[index]["code"]]
+                                for symbol, index in self.watchlist]}
+        if self.params is not None:
+            record["params"] = list(self.params)
+        if self.muted:
+            record["muted"] = True
+        if not self.active:
+            record["active"] = False
+        return record
@@ -0,0 +1,82 @@
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None and os.getenv("TV_JSON_BACKEND", "orjson") == "orjson":
+    loads = orjson.loads
+else:
+    loads = json.loads
+
+HEARTBEAT = "h"
+MESSAGE = "m"
+
+_FRAME = "~m~"
+_HEARTBEAT = "~h~"
+_TYPE_PREFIX = '{"m":"'
+_SESSION_PREFIX = '","p":["'
+
+
+def iter_frames(data: str):
+    # Йдемо по кадрах ~m~<len>~m~<payload> за оголошеною довжиною,
+    # повертаємо лише межі payload без копіювання
+    pos = 0
+    size = len(data)
+    while pos < size:
+        if not data.startswith(_FRAME, pos):
+            raise ValueError(f"Bad frame at {pos}: {data[pos:pos + 16]!r}")
+        sep = data.index(_FRAME, pos + 3)
+        start = sep + 3
+        end = start + int(data[pos + 3:sep])
+        if end > size:
+            raise ValueError(f"Truncated frame at {pos}")
+        yield pos, start, end
+        pos = end
+
+
+def message_type(data: str, start: int, end: int):
+    if not data.startswith(_TYPE_PREFIX, start):
+        return None
+    type_end = data.find('"', start + 6, end)
+    if type_end == -1:
+        return None
+    return data[start + 6:type_end]
+
+
+def session_key(data: str, start: int, end: int):
+    # {"m":"du","p":["cs_xxxxxxxxxxxx",...
+    type_end = data.find('"', start + 6, end)
+    if type_end == -1 or not data.startswith(_SESSION_PREFIX, type_end):
+        return None
+    key_start = type_end + len(_SESSION_PREFIX)
+    key_end = data.find('"', key_start, end)
+    if key_end == -1:
+        return None
+    return data[key_start:key_end]
+
+
+def decode(data: str, types=("du",), marker=None, sessions=None):
+    # Повертає (HEARTBEAT, кадр) для серцебиття і (MESSAGE, dict) лише для
+    # повідомлень потрібних типів, що містять marker і адресовані sessions;
+    # все інше пропускається без json-декодування
+    for frame_start, start, end in iter_frames(data):
+        if data.startswith(_HEARTBEAT, start):
+            yield HEARTBEAT, data[frame_start:end]
+            continue
+        kind = message_type(data, start, end)
+        if kind is not None:
+            if kind not in types:
+                continue
+            if sessions is not None and \
+                    session_key(data, start, end) not in sessions:
+                continue
+        if marker is not None and data.find(marker, start, end) == -1:
+            continue
+        message = loads(data[start:end])
+        if kind is None and (not isinstance(message, dict)
+                             or message.get("m") not in types):
+            continue
+        yield MESSAGE, message
@@ -0,0 +1,40 @@
+import asyncio
+from time import monotonic
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = None):
+        self._rate = rate
+        self._capacity = capacity or max(rate, 1)
+        self._tokens = self._capacity
+        self._updated = monotonic()
+
+    def _refill(self):
+        now = monotonic()
+        self._tokens = min(self._capacity,
+                           self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    @property
+    def full(self):
+        self._refill()
+        return self._tokens >= self._capacity
+
+    def delay(self):
+        self._refill()
+        if self._tokens >= 1:
+            return 0
+        return (1 - self._tokens) / self._rate
+
+    async def acquire(self):
+        while True:
+            delay = self.delay()
+            if not delay:
+                self._tokens -= 1
+                return
+            await asyncio.sleep(delay)
+
+    def block(self, seconds: float):
+        # після 429 не видаємо токенів seconds секунд
+        self._refill()
+        self._tokens = min(self._tokens, 0) - seconds * self._rate
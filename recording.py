@@ -0,0 +1,53 @@
+import os
+import struct
+import time
+import uuid
+
+# Запис: <час f64><напрямок u8><довжина u32><кадр utf-8>
+_HEADER = struct.Struct("<dBI")
+
+INCOMING = 0
+OUTGOING = 1
+
+
+class FrameRecorder:
+    def __init__(self, path: str):
+        self._path = path
+        self._file = open(path, "ab", buffering=1 << 16)
+
+    @property
+    def path(self):
+        return self._path
+
+    @classmethod
+    def in_directory(cls, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}.tvrec"
+        return cls(os.path.join(directory, name))
+
+    def write(self, direction: int, frame: str):
+        data = frame.encode("utf-8")
+        self._file.write(_HEADER.pack(time.time(), direction, len(data)))
+        self._file.write(data)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def read_frames(path: str):
+    # Повертає (час, напрямок, кадр) у порядку запису; обірваний
+    # останній запис (падіння процесу під час запису) пропускається
+    with open(path, "rb") as file:
+        data = file.read()
+    pos = 0
+    size = len(data)
+    while pos + _HEADER.size <= size:
+        timestamp, direction, length = _HEADER.unpack_from(data, pos)
+        pos += _HEADER.size
+        if pos + length > size:
+            break
+        yield timestamp, direction, data[pos:pos + length].decode("utf-8")
+        pos += length
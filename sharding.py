@@ -0,0 +1,326 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import hashlib
+from hub import (Stream, SubscriptionHub, SESSIONS_PER_SOCKET,
+                 HEALTH_INTERVAL, STREAMS, SUBSCRIPTIONS, HIBERNATING,
+                 FIRST_SIGNAL, STALLED)
+from engine import StudyParams
+import metrics
+from metrics import Counter, Gauge
+
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS") or 0)
+RESPAWN_DELAY = 1.0
+
+OPEN = 0
+CLOSE = 1
+# подія воркера зі знімком здоров'я його потоків
+HEALTH = 2
+# подія воркера зі знімком його метрик
+METRICS = 3
+# воркер імпортувався і запустив свій хаб
+READY = 4
+
+logger = logging.getLogger(__name__)
+
+WORKERS_ALIVE = Gauge("shard_workers_alive", "Alive stream worker processes")
+WORKER_STREAMS = Gauge("shard_worker_streams", "Streams owned by a worker",
+                       ("worker",))
+WORKER_DEATHS = Counter("shard_worker_deaths_total",
+                        "Stream worker processes that died")
+WORKER_START = Gauge("shard_worker_start_seconds",
+                     "Time from spawn to a running worker hub", ("worker",))
+# метрики хаба, які ShardedHub веде сам у процесі бота; у воркері вони
+# описують лише його частину потоків і назад не пересилаються
+LOCAL_METRICS = {metric.name for metric in (STREAMS, SUBSCRIPTIONS,
+                                            HIBERNATING, FIRST_SIGNAL,
+                                            STALLED)}
+
+
+def _worker_main(conn, sessions_per_socket):
+    asyncio.run(_worker(conn, sessions_per_socket))
+
+
+async def _worker(conn, sessions_per_socket):
+    # Воркер тримає потоки TradingView і шле назад лише компактні
+    # події (symbol, timeframe, params, signal, close) та раз на
+    # HEALTH_INTERVAL - (HEALTH, знімок здоров'я) і (METRICS, знімок
+    # метрик TradingView)
+    loop = asyncio.get_running_loop()
+    commands = asyncio.Queue()
+
+    async def on_signal(_, symbol, timeframe, signal, close, params):
+        conn.send((symbol, timeframe, params, signal, close))
+
+    def readable():
+        try:
+            while conn.poll():
+                commands.put_nowait(conn.recv())
+        except (EOFError, OSError):
+            loop.remove_reader(conn.fileno())
+            commands.put_nowait(None)
+
+    async def report():
+        while True:
+            await asyncio.sleep(HEALTH_INTERVAL)
+            try:
+                conn.send((HEALTH, hub.health(streams=True)))
+                conn.send((METRICS, metrics.snapshot(LOCAL_METRICS)))
+            except (BrokenPipeError, OSError):
+                return
+
+    hub = SubscriptionHub(on_signal, sessions_per_socket)
+    hub.start()
+    conn.send((READY,))
+    reporter = asyncio.create_task(report())
+    loop.add_reader(conn.fileno(), readable)
+    while True:
+        command = await commands.get()
+        if command is None:
+            break
+        op, symbol, timeframe, params = command
+        if op == OPEN:
+            await hub.subscribe(0, symbol, timeframe, params)
+        else:
+            await hub.unsubscribe(0, symbol, timeframe, params)
+    reporter.cancel()
+    await hub.close()
+
+
+class Worker:
+    def __init__(self, slot: int, process, conn, spawned: float):
+        self.slot = slot
+        self.process = process
+        self.conn = conn
+        self.streams = set()
+        self.health = None
+        self.spawned = spawned
+
+
+# Той самий інтерфейс, що й SubscriptionHub, але потоки розкладаються
+# по SHARD_WORKERS процесах rendezvous-хешуванням (symbol, timeframe),
+# тож усі параметри однієї серії ділять сесію в одному воркері.
+# Процес бота лише тримає підписників і розсилає сигнали; коли воркер
+# падає, його потоки переходять до живих, а після перезапуску частина
+# повертається назад
+class ShardedHub(SubscriptionHub):
+    def __init__(self, on_signal, workers=SHARD_WORKERS,
+                 sessions_per_socket=SESSIONS_PER_SOCKET):
+        super().__init__(on_signal, sessions_per_socket)
+        self._context = multiprocessing.get_context("spawn")
+        self._workers = [None] * workers
+        self._closing = False
+        self._tasks = set()
+
+    def start(self):
+        super().start()
+        for slot in range(len(self._workers)):
+            self._spawn(slot)
+
+    def _spawn(self, slot):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main, args=(child_conn, self._sessions_per_socket),
+            name=f"stream-worker-{slot}", daemon=True)
+        spawned = asyncio.get_running_loop().time()
+        process.start()
+        child_conn.close()
+        worker = Worker(slot, process, parent_conn, spawned)
+        self._workers[slot] = worker
+        asyncio.get_running_loop().add_reader(
+            parent_conn.fileno(), self._on_readable, worker)
+        self._update_worker_gauges()
+        return worker
+
+    def _create_task(self, coro):
+        # цикл подій тримає задачі лише слабкими посиланнями
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _alive(self):
+        return [w for w in self._workers if w is not None]
+
+    def _owner(self, stream: Stream):
+        alive = self._alive()
+        if not alive:
+            return None
+        return max(alive, key=lambda w: hashlib.blake2b(
+            f"{w.slot}:{stream.symbol}:{stream.timeframe}".encode(),
+            digest_size=8).digest())
+
+    def _send(self, worker, command):
+        try:
+            worker.conn.send(command)
+        except (BrokenPipeError, OSError):
+            # воркер помер - потік буде перерозподілено
+            pass
+
+    async def _open_stream(self, stream: Stream):
+        worker = self._owner(stream)
+        stream.socket = worker
+        if worker is None:
+            return
+        worker.streams.add((stream.symbol, stream.timeframe, stream.params))
+        self._send(worker, (OPEN, stream.symbol, stream.timeframe,
+                            stream.params))
+        self._update_worker_gauges()
+
+    async def _close_stream(self, stream: Stream):
+        worker = stream.socket
+        if worker is None:
+            return
+        worker.streams.discard((stream.symbol, stream.timeframe,
+                                stream.params))
+        self._send(worker, (CLOSE, stream.symbol, stream.timeframe,
+                            stream.params))
+        self._update_worker_gauges()
+
+    def _on_readable(self, worker):
+        try:
+            while worker.conn.poll():
+                event = worker.conn.recv()
+                if event[0] == HEALTH:
+                    worker.health = event[1]
+                    continue
+                if event[0] == METRICS:
+                    metrics.set_remote(worker.slot, event[1])
+                    continue
+                if event[0] == READY:
+                    self._on_worker_ready(worker)
+                    continue
+                symbol, timeframe, params, signal, close = event
+                stream = self._streams.get((symbol, timeframe, params))
+                if stream is not None and stream.socket is worker:
+                    self._create_task(self._dispatch(stream, signal, close))
+        except (EOFError, OSError):
+            self._on_worker_death(worker)
+
+    def _on_worker_ready(self, worker):
+        # spawn, імпорти воркера і запуск його хаба
+        elapsed = asyncio.get_running_loop().time() - worker.spawned
+        WORKER_START.set(elapsed, str(worker.slot))
+        logger.info("Stream worker %s ready in %.2fs", worker.slot, elapsed)
+
+    def _on_worker_death(self, worker):
+        loop = asyncio.get_running_loop()
+        loop.remove_reader(worker.conn.fileno())
+        worker.conn.close()
+        if self._workers[worker.slot] is worker:
+            self._workers[worker.slot] = None
+            WORKER_STREAMS.remove(str(worker.slot))
+            WORKER_START.remove(str(worker.slot))
+            metrics.remove_remote(worker.slot)
+            self._update_worker_gauges()
+        if self._closing:
+            return
+        WORKER_DEATHS.inc()
+        logger.warning("Stream worker %s died (exit code %s)",
+                       worker.slot, worker.process.exitcode)
+        self._create_task(self._rebalance())
+        loop.call_later(RESPAWN_DELAY, self._respawn, worker.slot)
+
+    def _respawn(self, slot):
+        if self._closing or self._workers[slot] is not None:
+            return
+        self._spawn(slot)
+        self._create_task(self._rebalance())
+
+    async def _rebalance(self):
+        for stream in list(self._streams.values()):
+            if stream.hibernating:
+                continue
+            owner = self._owner(stream)
+            if owner is stream.socket:
+                continue
+            if stream.socket is not None and \
+                    self._workers[stream.socket.slot] is stream.socket:
+                await self._close_stream(stream)
+            await self._open_stream(stream)
+
+    async def check_health(self):
+        # потоки перевіряють самі воркери, тут лише зведення їхніх знімків
+        STALLED.set(sum((worker.health or {}).get("streams_stalled", 0)
+                        for worker in self._alive()))
+
+    def health(self, streams=False):
+        sockets, reported = [], {}
+        for worker in self._alive():
+            snapshot = worker.health or {}
+            for socket in snapshot.get("sockets", ()):
+                sockets.append(dict(socket, worker=worker.slot))
+            for entry in snapshot.get("streams", ()):
+                key = (entry["symbol"], entry["timeframe"],
+                       StudyParams(*entry["params"]))
+                reported[key] = entry
+        entries = []
+        for key, stream in self._streams.items():
+            worker = None if stream.hibernating else stream.socket
+            entry = reported.get(key) if worker is not None else None
+            if entry is None:
+                entry = {"symbol": stream.symbol,
+                         "timeframe": stream.timeframe,
+                         "params": list(stream.params), "connected": False,
+                         "last_data_age": None, "recycles": 0,
+                         "restarts": 0, "stalled": False}
+            entries.append(dict(
+                entry, subscribers=len(stream.subscribers),
+                hibernating=stream.hibernating,
+                worker=worker.slot if worker is not None else None))
+        report = self._health_report(sockets, entries, streams)
+        report["workers_alive"] = len(self._alive())
+        report["ok"] = report["ok"] and \
+            report["workers_alive"] == len(self._workers)
+        return report
+
+    def _update_worker_gauges(self):
+        alive = self._alive()
+        WORKERS_ALIVE.set(len(alive))
+        for worker in alive:
+            WORKER_STREAMS.set(len(worker.streams), str(worker.slot))
+
+    async def close(self):
+        self._closing = True
+        if self._watchdog is not None:
+            self._watchdog.cancel()
+            self._watchdog = None
+        for task in list(self._tasks):
+            task.cancel()
+        workers = self._alive()
+        for worker in workers:
+            asyncio.get_running_loop().remove_reader(worker.conn.fileno())
+            # закрита труба - сигнал воркеру завершитись
+            worker.conn.close()
+        await asyncio.gather(*(self._stop_worker(worker)
+                               for worker in workers))
+        self._workers = [None] * len(self._workers)
+        self._streams.clear()
+        self._subscriptions = 0
+        self._hibernating = 0
+        self._update_gauges()
+
+    async def _stop_worker(self, worker):
+        if not await _wait_exit(worker.process, 5):
+            worker.process.terminate()
+            await _wait_exit(worker.process, 5)
+        metrics.remove_remote(worker.slot)
+
+
+async def _wait_exit(process, timeout):
+    # join без блокування циклу подій: sentinel стає читабельним, коли
+    # процес завершився
+    loop = asyncio.get_running_loop()
+    exited = loop.create_future()
+    loop.add_reader(process.sentinel, lambda: exited.done() or
+                    exited.set_result(None))
+    try:
+        await asyncio.wait_for(exited, timeout)
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        loop.remove_reader(process.sentinel)
+    # sentinel закривається трохи раніше, ніж процес можна забрати
+    # waitpid, тож join чекає лише цю мить
+    process.join()
+    return True
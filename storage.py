@@ -0,0 +1,137 @@
+import asyncio
+import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+
+class UserStore:
+    def load(self) -> dict:
+        raise NotImplementedError
+
+    # records: {chat_id: json-рядок або None для видалення}
+    def save_many(self, records: dict):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JSONUserStore(UserStore):
+    def __init__(self, path: str):
+        self._path = path
+        self._users = {}
+
+    def load(self):
+        if os.path.exists(self._path):
+            with open(self._path, "r") as file:
+                self._users = {int(k): v for k, v in json.load(file).items()}
+        return dict(self._users)
+
+    def save_many(self, records):
+        for chat_id, data in records.items():
+            if data is None:
+                self._users.pop(chat_id, None)
+            else:
+                self._users[chat_id] = json.loads(data)
+
+        # пишемо в тимчасовий файл і атомарно підміняємо
+        tmp_path = self._path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self._users, file, indent=4)
+        os.replace(tmp_path, self._path)
+
+
+class SQLiteUserStore(UserStore):
+    def __init__(self, path: str):
+        self._path = path
+        self._db = None
+
+    def _connect(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self._path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS users ("
+                "chat_id INTEGER PRIMARY KEY, data TEXT NOT NULL)")
+        return self._db
+
+    def load(self):
+        rows = self._connect().execute("SELECT chat_id, data FROM users")
+        return {chat_id: json.loads(data) for chat_id, data in rows}
+
+    def save_many(self, records):
+        db = self._connect()
+        with db:
+            db.executemany(
+                "INSERT INTO users (chat_id, data) VALUES (?, ?) "
+                "ON CONFLICT(chat_id) DO UPDATE SET data = excluded.data",
+                [(k, v) for k, v in records.items() if v is not None])
+            db.executemany(
+                "DELETE FROM users WHERE chat_id = ?",
+                [(k,) for k, v in records.items() if v is None])
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+def open_store(kind: str, path: str) -> UserStore:
+    if kind == "json":
+        return JSONUserStore(path)
+    if kind == "sqlite":
+        return SQLiteUserStore(path)
+    raise ValueError(f"Unknown user store: {kind}")
+
+
+def migrate_json(store: UserStore, json_path: str):
+    # Одноразовий перенос старого users.json у нове сховище
+    if isinstance(store, JSONUserStore) or not os.path.exists(json_path):
+        return
+    with open(json_path, "r") as file:
+        old_users = json.load(file)
+    store.save_many({int(k): json.dumps(v) for k, v in old_users.items()})
+    os.replace(json_path, json_path + ".migrated")
+
+
+# Збирає зміни користувачів і записує їх пачками в окремому потоці,
+# кілька змін одного користувача між записами зливаються в одну
+class StoreWriter:
+    def __init__(self, store: UserStore, delay: float = 0.5):
+        self._store = store
+        self._delay = delay
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending = {}
+        self._task = None
+
+    def schedule(self, chat_id, data):
+        self._pending[chat_id] = data
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_later())
+
+    def delete(self, chat_id):
+        self.schedule(chat_id, None)
+
+    async def _flush_later(self):
+        await asyncio.sleep(self._delay)
+        await self.flush()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        records = {chat_id: None if data is None else json.dumps(data)
+                   for chat_id, data in pending.items()}
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor,
+                                   self._store.save_many, records)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        await self.flush()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._store.close)
+        self._executor.shutdown()
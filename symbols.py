@@ -0,0 +1,222 @@
+import asyncio
+import bisect
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from time import time, monotonic
+import websockets
+import protocol
+from tradingview import TradingViewConnection, WS_URL, WS_HEADERS
+from metrics import Counter, Histogram
+
+SYMBOL_CACHE_FILE = os.getenv("SYMBOL_CACHE_FILE") or "symbols.json"
+SYMBOL_TTL = float(os.getenv("SYMBOL_TTL") or 7 * 24 * 3600)
+# неіснуючі символи пам'ятаємо коротше - їх можуть додати на біржу
+SYMBOL_ERROR_TTL = float(os.getenv("SYMBOL_ERROR_TTL") or 3600)
+RESOLVE_TIMEOUT = float(os.getenv("SYMBOL_RESOLVE_TIMEOUT") or 10)
+
+# поля symbol_resolved, які зберігаємо
+INFO_FIELDS = ("name", "exchange", "description", "type", "pro_name",
+               "full_name")
+
+logger = logging.getLogger(__name__)
+
+LOOKUPS = Counter("symbol_lookups_total", "Symbol lookups by result",
+                  ("result",))
+RESOLVE_SECONDS = Histogram("symbol_resolve_seconds",
+                            "Symbol resolution round trips to TradingView")
+
+
+# Кеш відповідей symbol_resolved: {символ: [час, info або None]},
+# зберігається у json між перезапусками. Поруч - відсортований індекс
+# (ключ, символ) для пошуку за префіксом без мережі. Нові записи
+# скидаються на диск пачкою через save_delay в окремому потоці, як
+# у StoreWriter
+class SymbolCache:
+    def __init__(self, path=SYMBOL_CACHE_FILE, ttl=SYMBOL_TTL,
+                 error_ttl=SYMBOL_ERROR_TTL, save_delay: float = 1.0):
+        self._path = path
+        self._ttl = ttl
+        self._error_ttl = error_ttl
+        self._save_delay = save_delay
+        self._entries = {}
+        self._index = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._dirty = False
+        self._save_task = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self):
+        if self._path and os.path.exists(self._path):
+            with open(self._path, "r", encoding="utf-8") as file:
+                self._entries = json.load(file)
+            self._index = None
+
+    def _write(self, entries):
+        if not self._path:
+            return
+        tmp_path = self._path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(entries, file, ensure_ascii=False)
+        os.replace(tmp_path, self._path)
+
+    def schedule_save(self):
+        self._dirty = True
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self._save_later())
+
+    async def _save_later(self):
+        await asyncio.sleep(self._save_delay)
+        await self.flush()
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        self._dirty = False
+        # копія: записи змінюються в циклі подій, поки потік пише файл
+        entries = dict(self._entries)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._write, entries)
+
+    async def close(self):
+        if self._save_task is not None:
+            self._save_task.cancel()
+        await self.flush()
+        self._executor.shutdown()
+
+    def get(self, symbol: str):
+        # (True, info) - свіжий запис (info None для неіснуючого символу),
+        # (False, None) - запису немає або він застарів
+        entry = self._entries.get(symbol)
+        if entry is None:
+            return False, None
+        resolved_at, info = entry
+        ttl = self._ttl if info is not None else self._error_ttl
+        if time() - resolved_at > ttl:
+            return False, None
+        return True, info
+
+    def put(self, symbol: str, info):
+        if info is not None:
+            info = {key: info[key] for key in INFO_FIELDS if key in info}
+        now = time()
+        self._entries[symbol] = [now, info]
+        canonical = canonical_name(symbol, info)
+        if canonical != symbol:
+            self._entries[canonical] = [now, info]
+        self._index = None
+
+    def search(self, prefix: str, limit: int = 8):
+        if self._index is None:
+            self._index = sorted(
+                (key, symbol) for symbol, (_, info) in self._entries.items()
+                if info is not None and symbol == canonical_name(symbol, info)
+                for key in {symbol, symbol.split(":")[-1]})
+        prefix = prefix.upper()
+        found = []
+        pos = bisect.bisect_left(self._index, (prefix,))
+        while pos < len(self._index) and len(found) < limit:
+            key, symbol = self._index[pos]
+            if not key.startswith(prefix):
+                break
+            if symbol not in found:
+                found.append(symbol)
+            pos += 1
+        return found
+
+
+def canonical_name(symbol: str, info):
+    if not info:
+        return symbol
+    return info.get("pro_name") or info.get("full_name") or symbol
+
+
+# Перевірка символу перед створенням потоку: спершу кеш, і лише на
+# промах - окрема chart-сесія з resolve_symbol. Одночасні запити того ж
+# символу чекають один round trip
+class SymbolResolver:
+    def __init__(self, cache: SymbolCache):
+        self._cache = cache
+        self._inflight = {}
+
+    @property
+    def cache(self):
+        return self._cache
+
+    def search(self, prefix: str, limit: int = 8):
+        return self._cache.search(prefix, limit)
+
+    def suggest(self, symbol: str, limit: int = 8):
+        # для помилки в тикері вкорочуємо префікс, поки щось не знайдеться
+        ticker = symbol.upper().split(":")[-1]
+        for end in range(len(ticker), 1, -1):
+            found = self._cache.search(ticker[:end], limit)
+            if found:
+                return found
+        return []
+
+    async def resolve(self, symbol: str):
+        # info з symbol_resolved, None якщо символу немає; мережеві
+        # помилки прокидаються - символ лишається неперевіреним
+        symbol = symbol.upper()
+        cached, info = self._cache.get(symbol)
+        if cached:
+            LOOKUPS.inc("hit" if info is not None else "invalid")
+            return info
+
+        future = self._inflight.get(symbol)
+        if future is None:
+            future = asyncio.ensure_future(self._resolve_remote(symbol))
+            self._inflight[symbol] = future
+            future.add_done_callback(
+                lambda _: self._inflight.pop(symbol, None))
+        try:
+            info = await asyncio.shield(future)
+        except Exception:
+            LOOKUPS.inc("error")
+            raise
+        LOOKUPS.inc("miss" if info is not None else "invalid")
+        return info
+
+    async def canonical(self, symbol: str):
+        info = await self.resolve(symbol)
+        return None if info is None else canonical_name(symbol.upper(), info)
+
+    async def _resolve_remote(self, symbol: str):
+        started = monotonic()
+        info = await asyncio.wait_for(self._request(symbol), RESOLVE_TIMEOUT)
+        RESOLVE_SECONDS.observe(monotonic() - started)
+        self._cache.put(symbol, info)
+        self._cache.schedule_save()
+        return info
+
+    @staticmethod
+    async def _request(symbol: str):
+        session = TradingViewConnection._generate_session_key("cs")
+        build = TradingViewConnection._build_message
+        async with websockets.connect(
+            WS_URL, extra_headers=WS_HEADERS
+        ) as websocket:
+            await websocket.recv()
+            await websocket.send(TradingViewConnection._auth_message())
+            await websocket.send(build({
+                "m": "chart_create_session", "p": [session, ""]}))
+            await websocket.send(build({
+                "m": "resolve_symbol",
+                "p": [session, "sds_sym_1",
+                      "=" + json.dumps({"adjustment": "splits",
+                                        "symbol": symbol},
+                                       separators=(",", ":"))]}))
+            while True:
+                data = await websocket.recv()
+                for kind, msg in protocol.decode(
+                        data, ("symbol_resolved", "symbol_error")):
+                    if kind == protocol.HEARTBEAT:
+                        await websocket.send(msg)
+                    elif msg["m"] == "symbol_resolved":
+                        return msg["p"][2]
+                    else:
+                        return None
@@ -0,0 +1,134 @@
+import asyncio
+
+import binanceapi
+from binanceapi import OrderExecutor
+from fake_binance import FakeBinance, point_exchange
+
+SYMBOL = "BINANCE:EOSUSDT.P"
+
+
+async def start(server, stream=True):
+    runner, port = await server.serve(port=0)
+    executor = OrderExecutor(api_key="key", api_secret="secret",
+                             sandbox=True, pairs=[(SYMBOL, "15")], amount=1,
+                             user_stream_url=f"ws://127.0.0.1:{port}/ws")
+    point_exchange(executor._exchange, f"http://127.0.0.1:{port}")
+    await executor.start()
+    if stream:
+        await asyncio.wait_for(executor._stream_ready.wait(), 5)
+    return runner, executor
+
+
+async def stop(runner, executor):
+    await executor.close()
+    await runner.cleanup()
+
+
+def test_fill_arrives_through_user_stream():
+    async def run():
+        server = FakeBinance(fill_delay=0.1)
+        runner, executor = await start(server)
+        try:
+            status = await executor.execute(SYMBOL, "Long")
+        finally:
+            await stop(runner, executor)
+        return server, status
+
+    server, status = asyncio.run(run())
+    assert status == "FILLED"
+    assert server.calls["order POST"] == 1
+    # статус прийшов подією, без запиту ордера
+    assert "order GET" not in server.calls
+    assert server.orders[1000]["side"] == "BUY"
+
+
+def test_update_before_create_order_response():
+    async def run():
+        server = FakeBinance(early=True)
+        runner, executor = await start(server)
+        try:
+            status = await executor.execute(SYMBOL, "Short")
+            early = dict(executor._early_updates)
+        finally:
+            await stop(runner, executor)
+        return server, status, early
+
+    server, status, early = asyncio.run(run())
+    assert status == "FILLED"
+    assert "order GET" not in server.calls
+    assert early == {}
+
+
+def test_timeout_falls_back_to_fetch_order(monkeypatch):
+    monkeypatch.setattr(binanceapi, "ORDER_TIMEOUT", 0.2)
+
+    async def run():
+        server = FakeBinance(fill_delay=None)
+        runner, executor = await start(server)
+        try:
+            status = await executor.execute(SYMBOL, "Long")
+            pending = dict(executor._orders)
+        finally:
+            await stop(runner, executor)
+        return server, status, pending
+
+    server, status, pending = asyncio.run(run())
+    assert status == "FILLED"
+    assert server.calls["order GET"] == 1
+    assert pending == {}
+
+
+def test_order_is_not_held_while_user_stream_is_down():
+    async def run():
+        server = FakeBinance(fill_delay=None)
+        runner, executor = await start(server)
+        # user stream обірвався і ще не відновився
+        executor._stream_task.cancel()
+        await asyncio.gather(executor._stream_task, return_exceptions=True)
+        assert not executor._stream_ready.is_set()
+        try:
+            started = asyncio.get_running_loop().time()
+            status = await executor.execute(SYMBOL, "Long")
+            elapsed = asyncio.get_running_loop().time() - started
+        finally:
+            await stop(runner, executor)
+        return server, status, elapsed
+
+    server, status, elapsed = asyncio.run(run())
+    assert status == "FILLED"
+    assert server.calls["order GET"] == 1
+    assert elapsed < binanceapi.ORDER_TIMEOUT
+
+
+def test_unknown_market_places_no_order():
+    async def run():
+        server = FakeBinance()
+        runner, executor = await start(server, stream=False)
+        try:
+            status = await executor.execute("BINANCE:NOPEUSDT.P", "Long")
+        finally:
+            await stop(runner, executor)
+        return server, status
+
+    server, status = asyncio.run(run())
+    assert status is None
+    assert "order POST" not in server.calls
+
+
+def test_signals_trade_only_configured_pairs():
+    async def run():
+        server = FakeBinance(fill_delay=0.05)
+        runner, executor = await start(server)
+        try:
+            # той самий символ на іншому таймфреймі - не торгується
+            executor.on_signal(SYMBOL, "1", "Short", 1.0)
+            executor.on_signal("BINANCE:BTCUSDT.P", "15", "Short", 1.0)
+            executor.on_signal(SYMBOL, "15", "Long", 1.0)
+            await asyncio.gather(*executor._tasks)
+        finally:
+            await stop(runner, executor)
+        return server
+
+    server = asyncio.run(run())
+    assert server.calls["order POST"] == 1
+    assert server.orders[1000]["side"] == "BUY"
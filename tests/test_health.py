@@ -0,0 +1,103 @@
+import asyncio
+import time
+
+import hub
+import tradingview
+from fake_tradingview import FakeTradingView
+from hub import SubscriptionHub, RECYCLES
+
+
+def test_silent_stream_restarts_with_backoff_and_stays_unhealthy(monkeypatch):
+    monkeypatch.setattr(hub, "HEALTH_INTERVAL", 0.05)
+    monkeypatch.setattr(hub, "STREAM_STALL", 0.4)
+    monkeypatch.setattr(hub, "STREAM_RESTART_MAX", 1.6)
+
+    def stream(report, symbol):
+        return next(entry for entry in report["streams"]
+                    if entry["symbol"] == symbol)
+
+    async def run():
+        server = FakeTradingView(interval=0.05, heartbeat=0.2)
+        ws_server = await server.serve(port=0)
+        port = ws_server.sockets[0].getsockname()[1]
+        monkeypatch.setattr(tradingview, "WS_URL", f"ws://127.0.0.1:{port}")
+        monkeypatch.setattr(tradingview, "WS_HEADERS", {})
+
+        async def on_signal(*_):
+            pass
+
+        subscriptions = SubscriptionHub(on_signal)
+        subscriptions.start()
+        await subscriptions.subscribe(1, "BINANCE:AUSDT", "1")
+        await subscriptions.subscribe(1, "BINANCE:BUSDT", "1")
+        await asyncio.sleep(0.5)
+        before = subscriptions.health(streams=True)
+
+        restarts = RECYCLES.value("session")
+        server.silent.add("BINANCE:BUSDT")
+        samples, moments = [], []
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            report = subscriptions.health(streams=True)
+            samples.append((stream(report, "BINANCE:BUSDT")["restarts"],
+                            report["ok"]))
+            count = RECYCLES.value("session") - restarts
+            if count > len(moments):
+                moments.append(time.monotonic())
+            await asyncio.sleep(0.02)
+        silent = subscriptions.health(streams=True)
+
+        server.silent.clear()
+        await asyncio.sleep(0.5)
+        after = subscriptions.health(streams=True)
+        await subscriptions.close()
+        ws_server.close()
+        await ws_server.wait_closed()
+        return before, samples, moments, silent, after
+
+    before, samples, moments, silent, after = asyncio.run(run())
+
+    assert before["ok"]
+    assert stream(before, "BINANCE:BUSDT")["last_data_age"] < 0.4
+
+    # перезапуски через 0.4, 0.8, 1.6, 1.6 с тиші, а не кожні 0.4 с
+    assert 3 <= len(moments) <= 5
+    gaps = [b - a for a, b in zip(moments, moments[1:])]
+    assert gaps[1] > gaps[0] * 1.5
+    # після другого перезапуску без даних потік завислий постійно,
+    # навіть у паузі одразу після перезапуску
+    assert all(not ok for restarts, ok in samples if restarts >= 2)
+    entry = stream(silent, "BINANCE:BUSDT")
+    assert entry["stalled"] and entry["restarts"] >= 2
+    assert entry["last_data_age"] > 3
+    assert not stream(silent, "BINANCE:AUSDT")["stalled"]
+
+    # дані повернулись - потік здоровий, лічильник скинуто
+    assert after["ok"]
+    entry = stream(after, "BINANCE:BUSDT")
+    assert entry["restarts"] == 0 and not entry["stalled"]
+    assert entry["last_data_age"] < 0.4
+
+
+def test_health_of_streams_asleep_before_opening():
+    async def run():
+        async def on_signal(*_):
+            pass
+
+        # вимкнений чат на старті: потік створюється вже сплячим і
+        # не відкривається, study у нього немає
+        subscriptions = SubscriptionHub(on_signal)
+        await subscriptions.set_active(1, False)
+        await subscriptions.subscribe(1, "BINANCE:AUSDT", "1")
+        report = subscriptions.health(streams=True)
+        await subscriptions.close()
+        return report
+
+    report = asyncio.run(run())
+    assert report["ok"]
+    assert report["hibernating"] == 1
+    assert report["streams"] == [{
+        "symbol": "BINANCE:AUSDT", "timeframe": "1",
+        "params": list(hub.DEFAULT_PARAMS), "subscribers": 1,
+        "hibernating": True, "connected": False, "last_data_age": None,
+        "recycles": 0, "restarts": 0, "stalled": False}]
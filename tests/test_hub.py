@@ -0,0 +1,51 @@
+import asyncio
+import time
+
+import tradingview
+from engine import DEFAULT_PARAMS
+from fake_tradingview import FakeTradingView
+from hub import SubscriptionHub
+
+CUSTOM = DEFAULT_PARAMS._replace(threshold=30)
+
+
+def test_listener_stream_ignores_chat_mute_and_params(monkeypatch):
+    async def run():
+        server = FakeTradingView(interval=0.05, heartbeat=0.2,
+                                 signal_every=2)
+        ws_server = await server.serve(port=0)
+        port = ws_server.sockets[0].getsockname()[1]
+        monkeypatch.setattr(tradingview, "WS_URL", f"ws://127.0.0.1:{port}")
+        monkeypatch.setattr(tradingview, "WS_HEADERS", {})
+
+        delivered, traded = [], []
+
+        async def on_signal(chat_id, *_):
+            delivered.append(chat_id)
+
+        subscriptions = SubscriptionHub(on_signal)
+        subscriptions.start()
+        # чат дивиться ту саму пару зі своїми параметрами і вимикає
+        # сигнали; підписка ордерів - на параметри за замовчуванням
+        await subscriptions.subscribe(1, "BINANCE:AUSDT", "1", CUSTOM)
+        await subscriptions.set_active(1, False)
+        listened = await subscriptions.add_listener(
+            lambda *signal: traded.append(signal), "BINANCE:AUSDT", "1")
+        deadline = time.monotonic() + 10
+        while len(traded) < 2 and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        await subscriptions.unsubscribe(1, "BINANCE:AUSDT", "1", CUSTOM)
+        streams = dict(subscriptions.streams)
+        await subscriptions.close()
+        ws_server.close()
+        await ws_server.wait_closed()
+        return listened, delivered, traded, streams
+
+    listened, delivered, traded, streams = asyncio.run(run())
+    assert len(traded) >= 2
+    assert {signal[:2] for signal in traded} == {("BINANCE:AUSDT", "1")}
+    assert delivered == []
+    assert not listened.hibernating
+    assert not listened.subscribers
+    # потік ордерів лишається і без жодного чату
+    assert list(streams) == [("BINANCE:AUSDT", "1", DEFAULT_PARAMS)]
@@ -0,0 +1,38 @@
+import metrics
+from metrics import Counter, Gauge, Histogram
+
+
+def test_worker_snapshots_render_with_worker_label(monkeypatch):
+    monkeypatch.setattr(metrics, "REGISTRY", [])
+    monkeypatch.setattr(metrics, "REMOTE", {})
+    sockets = Gauge("test_open_sockets", "Open sockets")
+    frames = Counter("test_frames_total", "Frames", ("kind",))
+    parse = Histogram("test_parse_seconds", "Parse time", buckets=(0.1, 1.0))
+
+    # у воркері
+    sockets.set(3)
+    frames.inc("du", amount=5)
+    parse.observe(0.5)
+    snapshot = metrics.snapshot(exclude={"test_frames_total"})
+    sockets.set(4)
+    metrics.set_remote(0, snapshot)
+    metrics.set_remote(1, {"test_frames_total": {("du",): 2}})
+    sockets._values.clear()
+    frames._values.clear()
+    parse._values.clear()
+
+    lines = metrics.render().splitlines()
+    # знімок - копія, а нуль процесу бота не додається до рядків воркерів
+    assert 'test_open_sockets{worker="0"} 3' in lines
+    assert "test_open_sockets 0" not in lines
+    assert 'test_frames_total{kind="du",worker="1"} 2' in lines
+    assert not any(line.startswith('test_frames_total{kind="du",worker="0"')
+                   for line in lines)
+    assert 'test_parse_seconds_bucket{worker="0",le="0.1"} 0' in lines
+    assert 'test_parse_seconds_bucket{worker="0",le="1.0"} 1' in lines
+    assert 'test_parse_seconds_count{worker="0"} 1' in lines
+
+    metrics.remove_remote(0)
+    lines = metrics.render().splitlines()
+    assert "test_open_sockets 0" in lines
+    assert not any('worker="0"' in line for line in lines)
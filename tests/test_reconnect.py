@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+import tradingview
+from fake_tradingview import FakeTradingView
+from tradingview import (TradingViewConnection, TradingViewMultiConnection,
+                         RECONNECTS, DOWNTIME)
+
+
+async def serve(server):
+    ws_server = await server.serve(port=0)
+    return ws_server, ws_server.sockets[0].getsockname()[1]
+
+
+def test_reconnect_replays_sessions_without_duplicates(monkeypatch):
+    async def run():
+        # бар триває 4 кадри, як кілька тиків справжнього бару
+        server = FakeTradingView(interval=0.05, heartbeat=0.2,
+                                 drop_after=15, signal_every=2,
+                                 ticks_per_bar=4)
+        ws_server, port = await serve(server)
+        monkeypatch.setattr(tradingview, "WS_URL", f"ws://127.0.0.1:{port}")
+        monkeypatch.setattr(tradingview, "WS_HEADERS", {})
+
+        multi = TradingViewMultiConnection(record_dir=None)
+        connection = TradingViewConnection("BINANCE:BTCUSDT", "1")
+        await multi.add_session(connection)
+        reconnects, downtime = RECONNECTS.value(), DOWNTIME.value()
+
+        signals = []
+
+        async def consume():
+            async for study, signal, _ in multi.connect_and_send():
+                signals.append((signal, study.signal_bar_time,
+                                server.connections))
+
+        task = asyncio.create_task(consume())
+        deadline = time.monotonic() + 20
+        while time.monotonic() < deadline and not any(
+                socket >= 3 for _, _, socket in signals):
+            await asyncio.sleep(0.05)
+        await multi.end_connection()
+        task.cancel()
+        ws_server.close()
+        await ws_server.wait_closed()
+        return server, multi, connection, signals, reconnects, downtime
+
+    server, multi, connection, signals, reconnects, downtime = \
+        asyncio.run(run())
+
+    # сервер обірвав щонайменше двічі, і кожне з'єднання відновилось
+    assert server.drops >= 2
+    assert multi.reconnects == server.connections - 1
+    # сесія заново створювалась на кожному з'єднанні під тим самим ключем
+    assert server.created.count(connection.session_key) == \
+        server.connections
+    # сигнали йдуть і після перепідключень, без повторів на тому ж барі
+    assert {socket for _, _, socket in signals} >= {1, 2, 3}
+    assert len(set((signal, bar) for signal, bar, _ in signals)) == \
+        len(signals)
+
+    assert RECONNECTS.value() - reconnects == multi.reconnects
+    assert multi.downtime > 0
+    assert abs(DOWNTIME.value() - downtime - multi.downtime) < 1e-6
@@ -0,0 +1,79 @@
+import asyncio
+import multiprocessing
+import signal
+import time
+
+import metrics
+import sharding
+from fake_tradingview import FakeTradingView
+from sharding import ShardedHub
+
+
+def test_sharded_signals_and_close_without_blocking(monkeypatch):
+    async def run():
+        server = FakeTradingView(interval=0.05, heartbeat=0.2,
+                                 signal_every=2)
+        ws_server = await server.serve(port=0)
+        port = ws_server.sockets[0].getsockname()[1]
+        # воркери читають адресу з оточення при імпорті tradingview
+        monkeypatch.setenv("TV_WS_URL", f"ws://127.0.0.1:{port}")
+        monkeypatch.setattr(sharding, "HEALTH_INTERVAL", 0.2)
+
+        delivered, traded = [], []
+
+        async def on_signal(chat_id, *_):
+            delivered.append(chat_id)
+
+        shards = ShardedHub(on_signal, workers=2)
+        shards.start()
+        await shards.subscribe(1, "BINANCE:AUSDT", "1")
+        await shards.add_listener(lambda *signal: traded.append(signal),
+                                  "BINANCE:BUSDT", "1")
+        deadline = time.monotonic() + 20
+        while (not delivered or not traded) and \
+                time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        processes = [worker.process for worker in shards._alive()]
+
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.005)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        started = time.monotonic()
+        await shards.close()
+        elapsed = time.monotonic() - started
+        ticker.cancel()
+        ws_server.close()
+        await ws_server.wait_closed()
+        return shards, delivered, traded, processes, ticks, elapsed
+
+    shards, delivered, traded, processes, ticks, elapsed = asyncio.run(run())
+    assert delivered and traded
+    assert len(processes) == 2
+    assert [process.exitcode for process in processes] == [0, 0]
+    # поки воркери завершуються, цикл подій працює далі
+    assert ticks > 0 and elapsed < 5
+    assert not shards._tasks
+    assert metrics.REMOTE == {}
+
+
+def test_wait_exit_times_out_then_reaps_terminated_process():
+    async def run():
+        process = multiprocessing.get_context("spawn").Process(
+            target=time.sleep, args=(30,), daemon=True)
+        process.start()
+        started = time.monotonic()
+        timed_out = await sharding._wait_exit(process, 0.2)
+        waited = time.monotonic() - started
+        process.terminate()
+        exited = await sharding._wait_exit(process, 5)
+        return process, timed_out, waited, exited
+
+    process, timed_out, waited, exited = asyncio.run(run())
+    assert not timed_out and 0.2 <= waited < 1
+    assert exited and process.exitcode == -signal.SIGTERM
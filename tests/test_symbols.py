@@ -0,0 +1,49 @@
+import asyncio
+import json
+import threading
+
+from symbols import SymbolCache, SymbolResolver
+
+
+def info(name):
+    return {"name": name, "exchange": "BINANCE",
+            "pro_name": f"BINANCE:{name}"}
+
+
+def test_resolved_symbols_are_saved_in_one_batch(tmp_path, monkeypatch):
+    path = tmp_path / "symbols.json"
+    writes = []
+
+    async def run():
+        cache = SymbolCache(str(path), save_delay=0.1)
+        write = cache._write
+
+        def counted(entries):
+            writes.append((threading.current_thread(), len(entries)))
+            write(entries)
+        monkeypatch.setattr(cache, "_write", counted)
+
+        resolver = SymbolResolver(cache)
+
+        async def request(symbol):
+            return info(symbol) if symbol != "NOPE" else None
+        monkeypatch.setattr(resolver, "_request", request)
+
+        found = await asyncio.gather(*(resolver.resolve(symbol) for symbol in
+                                       ("BTCUSDT", "ETHUSDT", "NOPE")))
+        assert not path.exists()
+        await asyncio.sleep(0.3)
+        saved = json.loads(path.read_text())
+
+        await resolver.resolve("SOLUSDT")
+        await cache.close()
+        return found, saved
+
+    found, saved = asyncio.run(run())
+    assert found[2] is None
+    # BTCUSDT, BINANCE:BTCUSDT, ETHUSDT, BINANCE:ETHUSDT, NOPE
+    assert len(saved) == 5
+    # одна пачка на три промахи, друга - при закритті; не з циклу подій
+    assert [size for _, size in writes] == [5, 7]
+    assert all(thread is not threading.main_thread() for thread, _ in writes)
+    assert "BINANCE:SOLUSDT" in json.loads(path.read_text())
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import os
+import shutil
+import signal
+import socket
+import sys
+
+from fake_telegram import FakeTelegram
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def start_bot(workdir, telegram_port, **overrides):
+    shutil.copy(os.path.join(ROOT, "messages.json"), workdir)
+    env = dict(os.environ, API_TOKEN="1:test",
+               TELEGRAM_API_URL=f"http://127.0.0.1:{telegram_port}",
+               TV_WS_URL="ws://127.0.0.1:1", USER_STORE="json",
+               PORT=str(free_port()), SHARD_WORKERS="0")
+    env.update(overrides)
+    for name in ("BINANCE_API_KEY", "WEBHOOK_URL"):
+        if not env.get(name):
+            env.pop(name, None)
+    return await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(ROOT, "bot.py"), cwd=workdir, env=env,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+
+
+async def wait_for(condition, timeout=30):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.05)
+
+
+async def stop_bot(process):
+    if process.returncode is None:
+        process.send_signal(signal.SIGTERM)
+    try:
+        return await asyncio.wait_for(process.wait(), 20)
+    except asyncio.TimeoutError:
+        process.kill()
+        raise
+
+
+def test_webhook_update_is_answered_and_saved_on_sigterm(tmp_path):
+    with open(os.path.join(ROOT, "messages.json"), encoding="utf-8") as file:
+        welcome = json.load(file)["START_MESSAGE"]
+
+    async def run():
+        telegram = FakeTelegram()
+        runner = await telegram.serve(port=0)
+        port = runner.addresses[0][1]
+        bot_port = free_port()
+        process = await start_bot(
+            tmp_path, port, PORT=str(bot_port),
+            WEBHOOK_URL=f"http://127.0.0.1:{bot_port}",
+            WEBHOOK_SECRET="secret")
+        try:
+            await asyncio.wait_for(telegram.webhook_set.wait(), 30)
+            status = await telegram.push(1, "/start")
+            await wait_for(lambda: telegram.sent)
+            # SIGTERM одразу, поки запис користувача ще чекає в StoreWriter
+            code = await stop_bot(process)
+        finally:
+            if process.returncode is None:
+                process.kill()
+            await telegram.close()
+            await runner.cleanup()
+        return telegram, status, code
+
+    telegram, status, code = asyncio.run(run())
+    assert telegram.webhook_url.endswith("/webhook")
+    assert telegram.secret_token == "secret"
+    assert status == 200
+    assert [(chat_id, text) for _, chat_id, text in telegram.sent] == \
+        [(1, welcome)]
+    assert code == 0
+    with open(tmp_path / "users.json") as file:
+        assert "1" in json.load(file)
+
+
+def test_polling_removes_webhook_left_by_webhook_mode(tmp_path):
+    async def run():
+        telegram = FakeTelegram()
+        runner = await telegram.serve(port=0)
+        port = runner.addresses[0][1]
+        # попередній запуск із WEBHOOK_URL
+        telegram.webhook_url = "http://127.0.0.1:1/webhook"
+        process = await start_bot(tmp_path, port, WEBHOOK_URL="")
+        try:
+            await wait_for(lambda: telegram.calls.get("getUpdates"))
+            code = await stop_bot(process)
+        finally:
+            if process.returncode is None:
+                process.kill()
+            await telegram.close()
+            await runner.cleanup()
+        return telegram, code
+
+    telegram, code = asyncio.run(run())
+    assert telegram.calls["deleteWebhook"] == 1
+    assert telegram.webhook_url is None
+    assert code == 0
@@ -1,16 +1,237 @@
+import asyncio
+import functools
+import logging
 import os
+import random
+import re
 import websockets
 import uuid
 import json
-import re
-from time import time
+from time import time, perf_counter, monotonic
+import protocol
+from engine import SignalEngine, StudyParams, DEFAULT_PARAMS
+from recording import FrameRecorder, INCOMING, OUTGOING
+from metrics import Counter, Gauge, Histogram
+from logs import get_sampled_logger
+
+WS_URL = os.getenv("TV_WS_URL") or "wss://data.tradingview.com/socket.io/websocket?from=chart%2FyCgakbNi%2F&date=2024_12_25-14_03&type=chart"
+WS_HEADERS = {
+    "Host": "data.tradingview.com",
+    "Connection": "Upgrade",
+    "Pragma": "no-cache",
+    "Cache-Control": "no-cache",
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/130.0.0.0 Safari/537.36 Edg/130.0.0.0"
+    ),
+    "Upgrade": "websocket",
+    "Origin": "https://ru.tradingview.com",
+    "Accept-Encoding": "gzip, deflate, br, zstd",
+    "Accept-Language": "ru"
+}
+# дані будь-якого study сесії: {"st7":{"st":[...]}, "st8":{"st":[...]}}
+STUDY_MARKER = '"st":['
+SERIES_MARKER = '"sds_1":'
+
+# "study" - сигнали рахує Pine-скрипт на стороні TradingView,
+# "local" - підписуємось лише на бари і рахуємо сигнали через engine.py
+SIGNAL_ENGINE = os.getenv("SIGNAL_ENGINE") or "study"
+if SIGNAL_ENGINE == "local":
+    MESSAGE_TYPES = ("du", "timescale_update")
+    MESSAGE_MARKER = SERIES_MARKER
+else:
+    MESSAGE_TYPES = ("du",)
+    MESSAGE_MARKER = STUDY_MARKER
+
+# Сигнал study видається лише після закриття бару, а не при першій
+# появі на бару, що формується
+CONFIRM_ON_CLOSE = os.getenv("SIGNAL_CONFIRM_ON_CLOSE") == "1"
+
+# Якщо задано, кожен сокет пише сирі кадри у <RECORD_DIR>/*.tvrec
+# для реплею через backtest.py
+RECORD_DIR = os.getenv("TV_RECORD_DIR")
+
+# Скільки різних наборів параметрів тримати готовими шаблонами create_study
+STUDY_TEMPLATE_CACHE = int(os.getenv("TV_STUDY_TEMPLATE_CACHE") or 128)
+
+logger = logging.getLogger(__name__)
+frame_logger = get_sampled_logger("tradingview.frames")
+
+OPEN_SOCKETS = Gauge("tradingview_open_sockets",
+                     "Open TradingView websockets")
+PEAK_SOCKETS = Gauge("tradingview_open_sockets_peak",
+                     "Most TradingView websockets open at once")
+FRAMES = Counter("tradingview_frames_total",
+                 "Websocket frames received from TradingView")
+MESSAGES = Counter("tradingview_stream_messages_total",
+                   "Decoded data messages per stream",
+                   ("symbol", "timeframe"))
+PARSE_SECONDS = Histogram("tradingview_parse_seconds",
+                          "Decode and signal time per data message",
+                          ("symbol", "timeframe"),
+                          buckets=(0.00001, 0.000025, 0.00005, 0.0001,
+                                   0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                                   0.01))
+SIGNALS = Counter("tradingview_signals_total", "Signals produced",
+                  ("symbol", "timeframe", "signal"))
+RECONNECTS = Counter("tradingview_reconnects_total",
+                     "Reconnects to TradingView after a dropped socket")
+DOWNTIME = Counter("tradingview_downtime_seconds_total",
+                   "Time spent without a TradingView socket")
+HEARTBEATS = Counter("tradingview_heartbeats_total",
+                     "Heartbeats echoed back to TradingView")
+
+
+SHORT = 1
+LONG = 2
+
+
+# Стан дедуплікації по барах: не більше одного сигналу кожного напрямку
+# на бар. Кільце з кількох останніх барів живе разом із сесією, тому
+# переживає перепідключення
+class BarDedup:
+    def __init__(self, size: int = 4):
+        self._times = [None] * size
+        self._flags = [0] * size
+        self._pos = 0
+
+    def mark(self, bar_time, direction: int) -> bool:
+        for i, known_time in enumerate(self._times):
+            if known_time == bar_time:
+                if self._flags[i] & direction:
+                    return False
+                self._flags[i] |= direction
+                return True
+        self._pos = (self._pos + 1) % len(self._times)
+        self._times[self._pos] = bar_time
+        self._flags[self._pos] = direction
+        return True
+
+
+# Один набір входів стратегії на chart-сесії: у режимі "study" - окремий
+# create_study, у режимі "local" - набір параметрів спільного SignalEngine.
+# Стан дедуплікації живе тут, тож study можна перенести на іншу сесію
+class Study:
+    def __init__(self, params=DEFAULT_PARAMS, study_id: str = None):
+        self.params = StudyParams(*params)
+        self.id = study_id
+        self.connection = None
+        self.index = None
+        self.signal_bar_time = None
+        self._dedup = BarDedup()
+        self._history = True
+        self._bar = None
+        self._frame = None
+        # monotonic-час останніх даних study (None - даних ще не було) і
+        # останнього (пере)запуску його сесії, від якого рахується пауза
+        # до перевірки на зависання
+        self.last_data = None
+        self.started = None
+        # перезапуски сесії поспіль через відсутність даних
+        self.restarts = 0
+
+    @property
+    def idle_restarts(self):
+        # перезапуски, після яких дані так і не з'явились
+        if self.last_data is not None and self.last_data >= self.started:
+            return 0
+        return self.restarts
+
+    def silent_for(self, now):
+        # скільки study без даних від (пере)запуску сесії
+        if self.last_data is None:
+            return now - self.started
+        return now - max(self.last_data, self.started)
+
+
+def study_params(inputs):
+    # параметри з входів in_0..in_7 кадру create_study
+    return StudyParams(*(inputs[f"in_{i}"]["v"]
+                         for i in range(len(StudyParams._fields))))
 
 
 class TradingViewConnection:
-    def __init__(self, symbol: str, timeframe: str):
-        self._chart_session_key = self._generate_session_key("cs")
+    def __init__(self, symbol: str, timeframe: str,
+                 confirm_on_close: bool = CONFIRM_ON_CLOSE,
+                 session_key: str = None, params=DEFAULT_PARAMS):
+        self._chart_session_key = session_key or \
+            self._generate_session_key("cs")
         self._symbol = symbol
         self._timeframe = timeframe
+        self._confirm_on_close = confirm_on_close
+        self.emit_history = False
+        self._engine = SignalEngine(()) if SIGNAL_ENGINE == "local" else None
+        self._engine_index = {}
+        self._bar = None
+        self._series_frames = None
+        self._studies = {}
+        self._next_study = 7
+        self.recycles = 0
+        self.study = None
+        if params is not None:
+            self.study = Study(params)
+            self.add_study(self.study)
+
+    @property
+    def session_key(self):
+        return self._chart_session_key
+
+    @property
+    def symbol(self):
+        return self._symbol
+
+    @property
+    def timeframe(self):
+        return self._timeframe
+
+    @property
+    def studies(self):
+        return list(self._studies.values())
+
+    @property
+    def signal_bar_time(self):
+        return self.study.signal_bar_time if self.study else None
+
+    def add_study(self, study: Study):
+        # повертає кадри, які треба надіслати на вже відкриту сесію
+        if study.id is None or study.id in self._studies:
+            while f"st{self._next_study}" in self._studies:
+                self._next_study += 1
+            study.id = f"st{self._next_study}"
+        study.connection = self
+        study._frame = None
+        study.started = monotonic()
+        study.restarts = 0
+        self._studies[study.id] = study
+        if self._engine is not None:
+            index = self._engine_index.get(study.params)
+            if index is None:
+                index = self._engine_index[study.params] = \
+                    self._engine.add_params(study.params)
+            study.index = index
+            return []
+        study._history = True
+        return [self._study_frame(study)]
+
+    def remove_study(self, study: Study):
+        if self._studies.get(study.id) is not study:
+            return []
+        del self._studies[study.id]
+        study.connection = None
+        if self._engine is not None:
+            # набір параметрів лишається в рушії до кінця сесії
+            return []
+        return [self._build_message({
+            "m": "remove_study",
+            "p": [self._chart_session_key, study.id]
+        })]
+
+    def _study_frame(self, study: Study):
+        if study._frame is None:
+            study._frame = _study_template(study.params).render(
+                session=self._chart_session_key, study=study.id)
+        return study._frame
 
     @staticmethod
     def _generate_session_key(prefix):
@@ -18,72 +239,92 @@ class TradingViewConnection:
 
     @staticmethod
     def _parse_websocket_message(message: str) -> list:
-        segments = re.split(r'~m~\d+~m~', message)
         json_messages = []
 
-        for segment in segments:
-            if segment:
-                json_data = json.loads(segment)
-                json_messages.append(json_data)
+        for _, start, end in protocol.iter_frames(message):
+            if not message.startswith("~h~", start):
+                json_messages.append(protocol.loads(message[start:end]))
 
         return json_messages
 
-    @staticmethod
-    def _timeframe_to_seconds(code):
-        conversion = {
-            "1": 60,          # 1 хвилина
-            "3": 180,         # 3 хвилини
-            "5": 300,         # 5 хвилин
-            "15": 900,        # 15 хвилин
-            "30": 1800,       # 30 хвилин
-            "45": 2700,       # 45 хвилин
-            "60": 3600,       # 1 година
-            "120": 7200,      # 2 години
-            "180": 10800,     # 3 години
-            "240": 14400,     # 4 години
-            "1D": 86400,      # 1 день
-            "1W": 604800,     # 1 тиждень
-            "1M": 2592000,    # 1 місяць (30 днів)
-            "3M": 7776000,    # 3 місяці
-            "6M": 15552000,   # 6 місяців
-            "12M": 31536000   # 12 місяців
-        }
-        return conversion.get(code)
-
     @staticmethod
     def _build_message(json_msg):
         msg = json.dumps(json_msg, ensure_ascii=False, separators=(',', ':'))
         prefix = f"~m~{len(msg)}~m~"
         return prefix + msg
 
-    def _prepare_messages(self):
-        auth_token_message = self._build_message({
+    @classmethod
+    def _auth_message(cls):
+        return cls._build_message({
             "m": "set_auth_token",
             "p": [os.getenv("TR_VIEW_AUTH_TOKEN")]
         })
 
-        chart_session_message = self._build_message({
-            "m": "chart_create_session",
-            "p": [self._chart_session_key, ""]
+    def _delete_session_message(self):
+        return self._build_message({
+            "m": "chart_delete_session",
+            "p": [self._chart_session_key]
         })
 
-        add_symbols_message = self._build_message({
-                "m": "resolve_symbol",
-                "p": [self._chart_session_key, "sds_sym_1",
-                      f'={{"adjustment":"splits",'
-                      f'"symbol":"{self._symbol}"}}']
-        })
+    def _prepare_messages(self):
+        return [self._auth_message()] + self._session_messages()
 
-        create_series_message = self._build_message({
-            "m": "create_series",
-            "p": [self._chart_session_key, "sds_1", "s1", "sds_sym_1",
-                  self._timeframe, 300, ""]
-        })
-        hueta_message = self._build_message({
+    def _start_session(self):
+        # після (пере)підключення перший пакет даних study - історія
+        now = monotonic()
+        for study in self._studies.values():
+            study._history = True
+            study.started = now
+        return self._session_messages()
+
+    def _renew_session(self):
+        # новий ключ сесії для перестворення застряглої сесії; стан study
+        # (дедуплікація, останній бар) лишається
+        self._chart_session_key = self._generate_session_key("cs")
+        self._series_frames = None
+        for study in self._studies.values():
+            study._frame = None
+        self.recycles += 1
+
+    def _session_messages(self):
+        # кадри серії незмінні для (ключ, символ, таймфрейм), кадри study -
+        # для (ключ, id, параметри), тому будуються один раз і повторно
+        # шлються після перепідключень
+        if self._series_frames is None:
+            key = self._chart_session_key
+
+            chart_session_message = _CREATE_SESSION.render(session=key)
+
+            add_symbols_message = self._build_message({
+                    "m": "resolve_symbol",
+                    "p": [key, "sds_sym_1",
+                          f'={{"adjustment":"splits",'
+                          f'"symbol":"{self._symbol}"}}']
+            })
+
+            create_series_message = self._build_message({
+                "m": "create_series",
+                "p": [key, "sds_1", "s1", "sds_sym_1",
+                      self._timeframe, 300, ""]
+            })
+
+            self._series_frames = [
+                chart_session_message,
+                add_symbols_message,
+                create_series_message
+            ]
+        if self._engine is not None:
+            return self._series_frames
+        return self._series_frames + [self._study_frame(study) for study
+                                      in self._studies.values()]
+
+    @staticmethod
+    def _study_payload(session_key, study_id="st7", params=DEFAULT_PARAMS):
+        return {
             "m": "create_study",
             "p": [
-                self._chart_session_key,
-                "st7",
+                session_key,
+                study_id,
                 "st1",
                 "sds_1",
                 "Script@tv-scripting-101!",
@@ -97,42 +338,42 @@ class TradingViewConnection:
                         "t": "text"
                     },
                     "in_0": {
-                        "v": 8,
+                        "v": params.fast_length,
                         "f": True,
                         "t": "float"
                     },
                     "in_1": {
-                        "v": 8,
+                        "v": params.signal_length,
                         "f": True,
                         "t": "float"
                     },
                     "in_2": {
-                        "v": 25,
+                        "v": params.threshold,
                         "f": True,
                         "t": "integer"
                     },
                     "in_3": {
-                        "v": False,
+                        "v": params.heikin_ashi,
                         "f": True,
                         "t": "bool"
                     },
                     "in_4": {
-                        "v": 2,
+                        "v": params.band_mult,
                         "f": True,
                         "t": "integer"
                     },
                     "in_5": {
-                        "v": 5,
+                        "v": params.cooldown,
                         "f": True,
                         "t": "integer"
                     },
                     "in_6": {
-                        "v": 20,
+                        "v": params.basis_length,
                         "f": True,
                         "t": "integer"
                     },
                     "in_7": {
-                        "v": 10,
+                        "v": params.atr_length,
                         "f": True,
                         "t": "integer"
                     },
@@ -143,75 +384,341 @@ class TradingViewConnection:
                     }
                 }
             ]
-        })
+        }
 
-        return [
-            auth_token_message,
-            chart_session_message,
-            add_symbols_message,
-            create_series_message,
-            hueta_message
-        ]
+    def _handle_message(self, msg):
+        if self._engine is not None:
+            return self._handle_series(msg)
+        return self._handle_studies(msg)
+
+    def _handle_series(self, msg):
+        series = msg["p"][1].get("sds_1")
+        if not series:
+            return
+        # перший timescale_update після (пере)підключення - історія,
+        # по ній лише прогріваємо рушій
+        history = msg["m"] == "timescale_update" and not self.emit_history
+        now = monotonic()
+        for study in self._studies.values():
+            study.last_data = now
+        for item in series.get("s", ()):
+            bar = item["v"]
+            if self._bar is not None and bar[0] < self._bar[0]:
+                continue
+            if self._bar is not None and bar[0] > self._bar[0]:
+                # почався новий бар - попередній закрито
+                _, open_, high, low, close = self._bar[:5]
+                long_, short = self._engine.update(open_, high, low, close)
+                for study in self.studies:
+                    study.signal_bar_time = self._bar[0]
+                    if history:
+                        continue
+                    if short[study.index]:
+                        yield study, "Short", close
+                    if long_[study.index]:
+                        yield study, "Long", close
+            self._bar = bar
+
+    def _handle_studies(self, msg):
+        data = msg["p"][1]
+        now = monotonic()
+        for study_id, study in list(self._studies.items()):
+            values = data.get(study_id)
+            if values and "st" in values:
+                study.last_data = now
+                for signal, close in self._handle_study(study, values["st"]):
+                    yield study, signal, close
+
+    def _handle_study(self, study: Study, items):
+        history = study._history and not self.emit_history
+        study._history = False
+        for item in items:
+            values = item["v"]
+            if study._bar is not None and values[0] < study._bar[0]:
+                continue
+            if self._confirm_on_close:
+                # сигнал бару - його останні значення перед закриттям
+                if study._bar is not None and values[0] > study._bar[0] \
+                        and not history:
+                    yield from self._study_signals(study, study._bar)
+            elif not history:
+                yield from self._study_signals(study, values)
+            study._bar = values
+
+    def _study_signals(self, study: Study, values):
+        bar_time = values[0]
+        short_v = values[-2]
+        long_v = values[-3]
+        close = values[-1]
+        frame_logger.debug("%s %s %s close=%s", self._symbol,
+                           self._timeframe, study.id, close)
+        study.signal_bar_time = bar_time
+        if short_v == 300 and study._dedup.mark(bar_time, SHORT):
+            yield "Short", close
+        if long_v == 200 and study._dedup.mark(bar_time, LONG):
+            yield "Long", close
 
     async def connect_and_send(self):
-        headers = {
-            "Host": "data.tradingview.com",
-            "Connection": "Upgrade",
-            "Pragma": "no-cache",
-            "Cache-Control": "no-cache",
-            "User-Agent": (
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/130.0.0.0 Safari/537.36 Edg/130.0.0.0"
-            ),
-            "Upgrade": "websocket",
-            "Origin": "https://ru.tradingview.com",
-            "Accept-Encoding": "gzip, deflate, br, zstd",
-            "Accept-Language": "ru"
-        }
-        ws_url = "wss://data.tradingview.com/socket.io/websocket?from=chart%2FyCgakbNi%2F&date=2024_12_25-14_03&type=chart"
+        self._multi_connection = TradingViewMultiConnection()
+        await self._multi_connection.add_session(self)
+        async for study, signal, close in \
+                self._multi_connection.connect_and_send():
+            if study is self.study:
+                yield signal, close
+
+    async def end_connection(self):
+        if getattr(self, "_multi_connection", None) is not None:
+            await self._multi_connection.end_connection()
+
+
+# Кадр зі статичним payload і змінними частинами (@@session@@,
+# @@study@@): json-серіалізація відбувається один раз, для сесії лише
+# склеюються рядки
+class FrameTemplate:
+    def __init__(self, payload):
+        text = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+        self._parts = _PLACEHOLDER.split(text)
+        self._size = sum(len(part) for part in self._parts[::2])
+
+    def render(self, **values) -> str:
+        parts = list(self._parts)
+        size = self._size
+        for i in range(1, len(parts), 2):
+            parts[i] = values[parts[i]]
+            size += len(parts[i])
+        return f"~m~{size}~m~" + "".join(parts)
+
+
+_PLACEHOLDER = re.compile(r"@@(\w+)@@")
+_CREATE_SESSION = FrameTemplate({"m": "chart_create_session",
+                                 "p": ["@@session@@", ""]})
+
+
+# типи входів in_0..in_7, як їх оголошує create_study
+STUDY_INPUT_TYPES = tuple(
+    TradingViewConnection._study_payload("", "")["p"][5][f"in_{index}"]["t"]
+    for index in range(len(DEFAULT_PARAMS)))
+
+
+# Параметри задають користувачі, тож кеш шаблонів обмежений: кожен -
+# кілька КБ тексту скрипта, а рендерений кадр і так лежить у Study
+@functools.lru_cache(maxsize=STUDY_TEMPLATE_CACHE)
+def _study_template(params):
+    return FrameTemplate(TradingViewConnection._study_payload(
+        "@@session@@", "@@study@@", params))
 
-        async with websockets.connect(
-            ws_url, extra_headers=headers
-        ) as websocket:
-            self._websocket = websocket
-            await websocket.recv()
 
-            messages = self._prepare_messages()
-            for message in messages:
-                await websocket.send(message)
-            await websocket.recv()
+class Backoff:
+    def __init__(self, base=1.0, factor=2.0, cap=60.0):
+        self._base = base
+        self._factor = factor
+        self._cap = cap
+        self._attempt = 0
 
+    def reset(self):
+        self._attempt = 0
+
+    def next_delay(self):
+        delay = min(self._cap, self._base * self._factor ** self._attempt)
+        self._attempt += 1
+        # половина затримки фіксована, половина випадкова
+        return delay / 2 + random.uniform(0, delay / 2)
+
+
+# Кілька chart-сесій на одному websocket: кожен "du" маршрутизується
+# за ключем сесії, додавання/видалення символу - окреме повідомлення.
+# Після обриву з'єднання сокет перепідключається з експоненційною
+# затримкою і заново відправляє повідомлення всіх сесій.
+# limiter (acquire/release) обмежує одночасні handshake-и сокетів
+class TradingViewMultiConnection:
+    def __init__(self, record_dir=RECORD_DIR, limiter=None):
+        self._sessions = {}
+        self._limiter = limiter
+        self._websocket = None
+        self._closed = False
+        self._recorder = None
+        if record_dir:
+            self._recorder = FrameRecorder.in_directory(record_dir)
+        self.reconnects = 0
+        self.downtime = 0.0
+        # monotonic-час останнього кадру і серцебиття поточного сокета
+        self.last_frame = None
+        self.last_heartbeat = None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    @property
+    def sessions(self):
+        return list(self._sessions.values())
+
+    @property
+    def connected(self):
+        return self._websocket is not None
+
+    async def recycle(self):
+        # обірвати відкритий, але мовчазний сокет: connect_and_send
+        # перепідключиться і заново створить усі сесії
+        if self._websocket is not None:
+            await self._websocket.close()
+
+    async def restart_session(self, connection: TradingViewConnection):
+        # сесія без даних при живому сокеті: видаляємо її на сервері і
+        # створюємо заново під новим ключем
+        if self._sessions.pop(connection.session_key, None) is None:
+            return
+        delete = connection._delete_session_message()
+        connection._renew_session()
+        self._sessions[connection.session_key] = connection
+        await self._send_frames([delete] + connection._start_session())
+
+    async def add_session(self, connection: TradingViewConnection):
+        self._sessions[connection.session_key] = connection
+        if self._websocket is not None:
             try:
-                prev_timestamp = {"timestamp": 0}
-                last = 0
-                while True:
-                    data = await websocket.recv()
+                for message in connection._start_session():
+                    await self._send(message)
+            except websockets.ConnectionClosed:
+                # сесію буде відновлено після перепідключення
+                pass
 
-                    if "~~h" in data:
-                        await websocket.send(data)
-                        continue
+    async def add_study(self, connection: TradingViewConnection,
+                        study: Study):
+        await self._send_frames(connection.add_study(study))
+
+    async def remove_study(self, connection: TradingViewConnection,
+                           study: Study):
+        await self._send_frames(connection.remove_study(study))
+
+    async def _send_frames(self, frames):
+        if self._websocket is None:
+            return
+        try:
+            for message in frames:
+                await self._send(message)
+        except websockets.ConnectionClosed:
+            # після перепідключення сесія відправить актуальні study
+            pass
+
+    async def remove_session(self, connection: TradingViewConnection):
+        if self._sessions.pop(connection.session_key, None) is None:
+            return
+        if self._websocket is not None:
+            try:
+                await self._send(connection._delete_session_message())
+            except websockets.ConnectionClosed:
+                pass
+
+    async def _send(self, message, websocket=None):
+        if self._recorder is not None:
+            self._recorder.write(OUTGOING, message)
+        await (websocket or self._websocket).send(message)
+
+    async def connect_and_send(self):
+        backoff = Backoff()
+        down_since = None
+        try:
+            while not self._closed:
+                try:
+                    async for item in self._connect_once():
+                        if down_since is not None:
+                            self._mark_up(time() - down_since)
+                            down_since = None
+                            backoff.reset()
+                        if item is not None:
+                            yield item
+                except Exception as e:
+                    logger.warning("TradingView socket error: %s", e)
+                if self._closed:
+                    break
+                if down_since is None:
+                    down_since = time()
+                await asyncio.sleep(backoff.next_delay())
+        finally:
+            if self._recorder is not None:
+                self._recorder.close()
+                self._recorder = None
+
+    def _mark_up(self, downtime):
+        self.reconnects += 1
+        self.downtime += downtime
+        RECONNECTS.inc()
+        DOWNTIME.inc(amount=downtime)
+
+    def _process(self, data):
+        # Спільний шлях для живого сокета і реплею записів: повертає
+        # (study, signal, close), а для серцебиття (None, кадр, None)
+        if self._recorder is not None:
+            self._recorder.write(INCOMING, data)
+        FRAMES.inc()
+        start = perf_counter()
+        for kind, msg in protocol.decode(data, MESSAGE_TYPES,
+                                         MESSAGE_MARKER, self._sessions):
+            if kind == protocol.HEARTBEAT:
+                self.last_heartbeat = monotonic()
+                yield None, msg, None
+                start = perf_counter()
+                continue
+            connection = self._sessions.get(msg["p"][0])
+            if connection is None:
+                continue
+            signals = list(connection._handle_message(msg))
+            labels = (connection.symbol, connection.timeframe)
+            MESSAGES.inc(*labels)
+            PARSE_SECONDS.observe(perf_counter() - start, *labels)
+            for study, signal, close in signals:
+                SIGNALS.inc(*labels, signal)
+                yield study, signal, close
+            start = perf_counter()
+
+    async def _connect_once(self):
+        limited = self._limiter is not None
+        if limited:
+            await self._limiter.acquire()
+        try:
+            async with websockets.connect(
+                WS_URL, extra_headers=WS_HEADERS
+            ) as websocket:
+                OPEN_SOCKETS.inc()
+                PEAK_SOCKETS.set(max(PEAK_SOCKETS.value(),
+                                     OPEN_SOCKETS.value()))
+                try:
+                    await websocket.recv()
+                    # токен не пишемо у запис
+                    await websocket.send(
+                        TradingViewConnection._auth_message())
+                    self._websocket = websocket
+                    self.last_frame = self.last_heartbeat = monotonic()
+
+                    for connection in list(self._sessions.values()):
+                        for message in connection._start_session():
+                            await self._send(message, websocket)
+                    if limited:
+                        limited = False
+                        self._limiter.release()
+                    yield None
 
-                    parsed_data = self._parse_websocket_message(data)
+                    while True:
+                        data = await websocket.recv()
+                        self.last_frame = monotonic()
 
-                    print(parsed_data)
-                    for msg in parsed_data:
-                        if msg.get("m") == "du" and "st7" in msg["p"][1]:
-                            values = msg["p"][1]["st7"]["st"][0]["v"]
-                            short_v = values[-2]
-                            long_v = values[-3]
-                            close = values[-1]
-                            if time() - prev_timestamp["timestamp"] < self._timeframe_to_seconds(self._timeframe):
+                        for study, signal, close in \
+                                self._process(data):
+                            if study is None:
+                                HEARTBEATS.inc()
+                                await self._send(signal, websocket)
                                 continue
-                            print(close)
-                            if short_v == 300:
-                                prev_timestamp["timestamp"] = time()
-                                yield "Short", close
-                            if long_v == 200:
-                                prev_timestamp["timestamp"] = time()
-                                yield "Long", close
-            except Exception as e:
-                print(e)
+                            yield study, signal, close
+                finally:
+                    OPEN_SOCKETS.dec()
+                    self._websocket = None
+                    if self._recorder is not None:
+                        self._recorder.flush()
+        finally:
+            if limited:
+                self._limiter.release()
 
     async def end_connection(self):
-        await self._websocket.close()
+        self._closed = True
+        if self._websocket is not None:
+            await self._websocket.close()